@@ -0,0 +1 @@
+"""LED Matrix runtime shared by the supervisor and the modes"""
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Layer compositor.
+
+Stacks layers on top of the running mode's frame before it goes out to the
+strip, so a notification badge or overlay can be shown without stopping the
+mode. Layers are composited in a fixed order, bottom to top:
+
+    mode            the frame of the running mode
+    overlay         e.g. a status indicator
+    notification    e.g. an ntfy message
+
+Every layer has an opacity, a blend mode (see BLEND_MODES) and a coverage
+mask: black pixels of a layer are transparent unless an explicit mask is
+given. A layer can expire after a number of seconds.
+
+Layers are kept as float32 arrays with their weight (opacity times mask)
+premultiplied, so compositing is a few whole-frame NumPy operations per
+layer. The result is cached until the mode's frame or a layer changes.
+
+Requires numpy; the host only imports this module once a layer is pushed.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+LAYERS = ("overlay", "notification")  # Bottom to top, above the mode
+
+BLEND_MODES = ("normal", "add", "multiply", "screen", "lighten")
+
+
+class Layer:
+    """One layer above the mode's frame"""
+
+    def __init__(self, pixels, mask, alpha=1.0, blend="normal", expires=None):
+        """
+        Initialize the layer
+
+        Args:
+            pixels: (n, 3) array of colors
+            mask: (n,) array of per-pixel coverage from 0.0 to 1.0
+            alpha: Opacity of the whole layer from 0.0 to 1.0
+            blend: One of BLEND_MODES
+            expires: time.monotonic() after which the layer is removed, or None
+        """
+        if blend not in BLEND_MODES:
+            raise ValueError(f"Unknown blend mode: {blend}")
+        self.pixels = np.asarray(pixels, np.float32).reshape(-1, 3)
+        self.weight = (np.asarray(mask, np.float32).reshape(-1, 1)
+                       * np.float32(max(0.0, min(1.0, alpha))))
+        self.alpha = alpha
+        self.blend = blend
+        self.expires = expires
+
+
+class Compositor:
+    """Composites layers on top of the mode's frames"""
+
+    def __init__(self, led_count):
+        """
+        Initialize the compositor
+
+        Args:
+            led_count: Number of LEDs in a frame
+        """
+        self.n = led_count
+        self.layers = {}
+        self._mode_alpha = 1.0
+        self._lock = threading.Lock()
+        self._work = np.empty((led_count, 3), np.float32)
+        self._blended = np.empty((led_count, 3), np.float32)
+        self._output = bytearray(led_count * 3)
+        self._out = np.frombuffer(self._output, np.uint8).reshape(-1, 3)
+        self._cached = None  # Copy of the mode frame the output was computed from
+
+    @property
+    def mode_alpha(self):
+        """Opacity of the mode's own frame, over black"""
+        return self._mode_alpha
+
+    @mode_alpha.setter
+    def mode_alpha(self, value):
+        self._mode_alpha = max(0.0, min(1.0, float(value)))
+        self._cached = None
+
+    @property
+    def active(self):
+        """True if compose() changes anything"""
+        return bool(self.layers) or self._mode_alpha < 1.0
+
+    def set_layer(self, name, pixels, mask=None, alpha=1.0, blend="normal", duration=None):
+        """
+        Add or replace a layer
+
+        Args:
+            name: One of LAYERS
+            pixels: Colors, an (n, 3) array or a sequence of n (r, g, b) colors
+            mask: Optional per-pixel coverage from 0.0 to 1.0; by default
+                every pixel that isn't black is covered
+            alpha: Opacity of the whole layer from 0.0 to 1.0
+            blend: One of BLEND_MODES
+            duration: Optional seconds after which the layer is removed
+        """
+        if name not in LAYERS:
+            raise ValueError(f"Unknown layer: {name} (use one of {', '.join(LAYERS)})")
+        pixels = np.asarray(pixels, np.float32).reshape(-1, 3)
+        if len(pixels) != self.n:
+            raise ValueError(f"Layer has {len(pixels)} pixels, expected {self.n}")
+        if mask is None:
+            mask = pixels.any(axis=1)
+        expires = time.monotonic() + duration if duration else None
+
+        layer = Layer(pixels, mask, alpha, blend, expires)
+        with self._lock:
+            self.layers[name] = layer
+            self._cached = None
+
+    def remove_layer(self, name=None):
+        """Remove a layer, or every layer if name is None"""
+        with self._lock:
+            if name is None:
+                self.layers.clear()
+            else:
+                self.layers.pop(name, None)
+            self._cached = None
+
+    def next_expiry(self):
+        """time.monotonic() at which the next layer expires, or None"""
+        expiries = [layer.expires for layer in list(self.layers.values()) if layer.expires]
+        return min(expiries) if expiries else None
+
+    def compose(self, frame, now=None):
+        """
+        Composite the layers on top of a frame
+
+        Args:
+            frame: Flat RGB bytes of the mode, 3 bytes per LED
+            now: time.monotonic(), to expire layers (defaults to now)
+
+        Returns:
+            Flat RGB bytes to show; valid until the next call
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [name for name, layer in self.layers.items()
+                       if layer.expires is not None and layer.expires <= now]
+            for name in expired:
+                del self.layers[name]
+                self._cached = None
+            layers = [self.layers[name] for name in LAYERS if name in self.layers]
+
+            if self._cached is not None and self._cached == frame:
+                return self._output
+
+            work = self._work
+            blended = self._blended
+            np.multiply(np.frombuffer(frame, np.uint8).reshape(-1, 3), np.float32(self._mode_alpha),
+                        out=work)
+            for layer in layers:
+                self._blend(layer, work, blended)
+                # Move towards the blended color by the layer's weight
+                blended -= work
+                blended *= layer.weight
+                work += blended
+
+            np.clip(work, 0, 255, out=work)
+            np.rint(work, out=work)
+            self._out[:] = work
+            self._cached = bytes(frame)
+            return self._output
+
+    @staticmethod
+    def _blend(layer, base, out):
+        """Color of the layer blended onto base, without its weight, into out"""
+        top = layer.pixels
+        if layer.blend == "normal":
+            out[:] = top
+        elif layer.blend == "add":
+            np.add(base, top, out=out)
+            np.minimum(out, 255, out=out)
+        elif layer.blend == "multiply":
+            np.multiply(base, top, out=out)
+            out /= 255
+        elif layer.blend == "screen":
+            # 255 - (255 - base) * (255 - top) / 255
+            np.subtract(255, base, out=out)
+            out *= 255 - top
+            out /= -255
+            out += 255
+        else:
+            np.maximum(base, top, out=out)
+
+
+def pixels_from_data(data, led_count, color=(255, 255, 255)):
+    """
+    Build a layer from a list of items, in the ntfy-sh mode's message format
+
+    Args:
+        data: Item or list of items, each with an "index" or a "pattern" (list
+            of 0/1, starting at "offset") and an optional "color"
+        led_count: Number of LEDs in a frame
+        color: Color of items without one
+
+    Returns:
+        (led_count, 3) uint8 array, black where no item is
+    """
+    pixels = np.zeros((led_count, 3), np.uint8)
+    if isinstance(data, dict):
+        data = [data]
+    for item in data or ():
+        item_color = item.get("color", color)
+        if isinstance(item.get("index"), int) and 0 <= item["index"] < led_count:
+            pixels[item["index"]] = item_color
+        if isinstance(item.get("pattern"), list):
+            offset = item.get("offset", 0)
+            for i, bit in enumerate(item["pattern"]):
+                if bit and 0 <= offset + i < led_count:
+                    pixels[offset + i] = item_color
+    return pixels
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Config file watcher.
+
+Calls back as soon as config.json is saved. Uses inotify through libc (no
+extra packages needed on the Pi) and falls back to comparing the file's
+mtime where inotify is not available.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import traceback
+
+POLL_INTERVAL = 0.5  # Seconds between mtime checks in fallback mode
+
+# inotify event masks (see <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _open_inotify():
+    """
+    Create an inotify instance
+
+    Returns:
+        (libc, fd) tuple, or None if inotify is not available
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init()
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    return libc, fd
+
+
+class ConfigWatcher:
+    """Watches a single file and calls a callback whenever it is written"""
+
+    def __init__(self, path, callback, poll_interval=POLL_INTERVAL):
+        """
+        Initialize the watcher
+
+        Args:
+            path: File to watch
+            callback: Called without arguments after the file changed
+            poll_interval: Seconds between checks when falling back to mtime polling
+        """
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.backend = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake_r, self._wake_w = os.pipe()
+
+    def start(self):
+        """Start watching in a background thread"""
+        inotify = _open_inotify()
+        if inotify:
+            libc, fd = inotify
+            directory = os.path.dirname(self.path).encode()
+            mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+            if libc.inotify_add_watch(fd, directory, mask) < 0:
+                os.close(fd)
+                inotify = None
+
+        if inotify:
+            self.backend = "inotify"
+            target, args = self._run_inotify, (inotify[1],)
+        else:
+            self.backend = "mtime"
+            target, args = self._run_polling, ()
+
+        self._thread = threading.Thread(target=target, args=args, name="config-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching"""
+        self._stop.set()
+        os.write(self._wake_w, b"\0")
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+    def _run_inotify(self, fd):
+        """Watch the file's directory, so editors that replace the file are seen too"""
+        name = os.path.basename(self.path).encode()
+        try:
+            while not self._stop.is_set():
+                readable, _, _ = select.select([fd, self._wake_r], [], [])
+                if fd not in readable:
+                    continue
+
+                data = os.read(fd, 4096)
+                changed = False
+                offset = 0
+                while offset < len(data):
+                    _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                    offset += _EVENT_HEADER.size
+                    event_name = data[offset:offset + length].rstrip(b"\0")
+                    offset += length
+                    if event_name == name:
+                        changed = True
+
+                # A burst of events from one save only triggers one reload
+                if changed:
+                    self._notify()
+        finally:
+            os.close(fd)
+
+    def _run_polling(self):
+        """Fallback: compare the file's mtime and size every poll_interval seconds"""
+        last = self._stat()
+        while not self._stop.wait(self.poll_interval):
+            current = self._stat()
+            if current != last:
+                last = current
+                self._notify()
+
+    def _notify(self):
+        """Call the callback; an error in it must not stop the watching"""
+        try:
+            self.callback()
+        except Exception:
+            print(f"Error applying changes to {self.path}")
+            traceback.print_exc()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Local control socket.
+
+Line based protocol over a Unix domain socket: one command per line, one
+JSON object per reply line.
+
+    mode <name>              switch to another mode
+    preload <name>           compile a mode and import its dependencies, so
+                             switching to it later is quick
+    brightness <0-1>         set brightness
+    pause / resume           freeze / continue the running mode
+    blank / unblank          turn the LEDs off / back on (the mode keeps running)
+    record <file>            record the shown frames to recordings/<file>
+                             (a plain file name, not a path)
+    record stop              stop recording
+    layer <name> <json>      show a layer over the mode: {"data": ...,
+                             "color": [r, g, b], "alpha": 0-1, "blend":
+                             normal/add/multiply/screen/lighten, "duration":
+                             seconds}, all but data optional
+    layer mode {"alpha": x}  dim the mode below the layers
+    layer clear [name]       remove one layer, or all of them
+    metrics                  frame timing per mode
+    status                   show the current state
+
+Example: echo status | nc -U ledmatrix.sock
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Handles one client connection, which may send several commands"""
+
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8", "replace").strip()
+            if not line:
+                continue
+
+            command, _, args = line.partition(" ")
+            try:
+                reply = self.server.dispatch(command.lower(), args.strip())
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ControlServer:
+    """Serves the control protocol on a Unix domain socket"""
+
+    def __init__(self, path, dispatch, group=None):
+        """
+        Initialize the control server
+
+        Args:
+            path: Path of the socket file
+            dispatch: Called as dispatch(command, args) for every command,
+                must return a JSON serializable dict
+            group: Optional group whose members may use the socket as well;
+                otherwise only the service's own user can
+        """
+        self.path = path
+        self.dispatch = dispatch
+        self.group = group
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Start serving in a background thread"""
+        if os.path.exists(self.path):
+            # Left behind by a previous run that didn't shut down cleanly
+            os.unlink(self.path)
+
+        # The service runs as root, so the socket must never be open to
+        # everyone, not even between creating it and the chmod
+        umask = os.umask(0o177)
+        try:
+            self._server = _Server(self.path, _RequestHandler)
+        finally:
+            os.umask(umask)
+        self._server.dispatch = self.dispatch
+        if self.group:
+            import grp
+
+            os.chown(self.path, -1, grp.getgrnam(self.group).gr_gid)
+            os.chmod(self.path, 0o660)
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="control", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and remove the socket file"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def send_command(path, line, timeout=2.0):
+    """
+    Send one command to a running supervisor
+
+    Args:
+        path: Path of the socket file
+        line: Command line, e.g. "brightness 0.5"
+        timeout: Seconds to wait for the reply
+
+    Returns:
+        The decoded reply
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(line.strip().encode() + b"\n")
+        reply = b""
+        while not reply.endswith(b"\n"):
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            reply += chunk
+    return json.loads(reply)
+
+
+def main():
+    """Command line client: python3 -m core.control status"""
+    import argparse
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description="Send a command to the LED matrix")
+    parser.add_argument("command", nargs="+", help="Command and arguments, e.g. brightness 0.5")
+    parser.add_argument(
+        "--socket", default=os.path.join(base_dir, "ledmatrix.sock"), help="Path to the control socket"
+    )
+
+    args = parser.parse_args()
+    print(json.dumps(send_command(args.socket, " ".join(args.command)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
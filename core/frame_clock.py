@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Fixed-timestep frame scheduler.
+
+A bare `time.sleep(0.1)` after drawing makes the real frame period sleep +
+compute + show, so a mode drifts slower than intended (and by how much
+depends on the Pi). FrameClock instead sleeps until absolute deadlines on
+the monotonic clock, one period apart:
+
+    clock = FrameClock(10)
+    while True:
+        render()
+        clock.tick()
+
+When a frame runs late the following deadlines stay on the original grid.
+A frame that is less than a period late starts the next one right away, so
+the time is made up over the following frames. Only deadlines that were
+missed entirely are skipped (and counted as dropped), rather than pushing
+every later frame back.
+"""
+
+import time
+from collections import deque
+
+
+class FrameClock:
+    """Paces a render loop at a fixed frame rate"""
+
+    def __init__(self, fps=None, period=None, window=64):
+        """
+        Initialize the clock
+
+        Args:
+            fps: Target frames per second
+            period: Target seconds per frame (instead of fps)
+            window: Number of recent frames the achieved FPS is averaged over
+        """
+        if (fps is None) == (period is None):
+            raise ValueError("Give either fps or period")
+        self.period = period if period is not None else 1.0 / fps
+        if self.period <= 0:
+            raise ValueError("Frame period must be positive")
+
+        self.frames = 0
+        self.dropped = 0
+        self._ticks = deque(maxlen=max(2, window))
+        self.reset()
+
+    @property
+    def target_fps(self):
+        return 1.0 / self.period
+
+    @property
+    def achieved_fps(self):
+        """Frames per second over the recent window, or None before two frames"""
+        ticks = self._ticks
+        if len(ticks) < 2 or ticks[-1] == ticks[0]:
+            return None
+        return (len(ticks) - 1) / (ticks[-1] - ticks[0])
+
+    def reset(self):
+        """
+        Start a fresh schedule from now
+
+        Call after deliberately pausing (e.g. a sleep between animations), so
+        the pause doesn't count as dropped frames.
+        """
+        self._deadline = time.monotonic() + self.period
+        self._ticks.clear()
+
+    def tick(self):
+        """
+        Sleep until the next frame is due
+
+        Returns:
+            Number of frame periods since the previous tick: 1 when on time,
+            more when frames were skipped to catch up
+        """
+        now = time.monotonic()
+        deadline = self._deadline
+        elapsed = 1
+
+        if now - deadline >= self.period:
+            # A whole period late: skip the deadlines that passed entirely
+            missed = int((now - deadline) / self.period)
+            deadline += missed * self.period
+            elapsed += missed
+            self.dropped += missed
+
+        # Through the module attribute, so the host's interruptible sleep
+        # applies; when a bit late, don't wait at all
+        time.sleep(max(0.0, deadline - now))
+
+        self._deadline = deadline + self.period
+        self.frames += 1
+        self._ticks.append(time.monotonic())
+        return elapsed
+
+    def stats(self):
+        """Frame counters as a dict, e.g. for logging"""
+        achieved = self.achieved_fps
+        return {
+            "target_fps": round(self.target_fps, 2),
+            "achieved_fps": round(achieved, 2) if achieved is not None else None,
+            "frames": self.frames,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Framebuffer for modes.
+
+A flat RGB bytearray with a dirty bit per pixel. Modes draw into it (through
+set(), fill() and friends, which keep the dirty bits) instead of keeping
+their own lists of colors, and present() only writes the pixels that
+changed since the last frame to the NeoPixel object. When nothing changed,
+the hardware write is skipped entirely.
+"""
+
+BLACK = (0, 0, 0)
+
+
+class Framebuffer:
+    """RGB framebuffer in front of a NeoPixel object"""
+
+    def __init__(self, pixels, width=8, height=8):
+        """
+        Initialize the framebuffer
+
+        Args:
+            pixels: NeoPixel object to present to (use auto_write=False)
+            width: Number of LEDs horizontally
+            height: Number of LEDs vertically
+        """
+        self.pixels = pixels
+        self.width = width
+        self.height = height
+        self.n = width * height
+
+        # 3 bytes per pixel, in LED order
+        self.buf = bytearray(self.n * 3)
+        self.view = memoryview(self.buf)
+
+        # What the LEDs currently show, to drop writes that change nothing
+        self._shown = bytearray(self.n * 3)
+        self._dirty = bytearray(self.n)
+        self._all_dirty = b"\x01" * self.n
+        self._all_clean = bytes(self.n)
+
+        # The first present() writes every pixel, whatever the LEDs showed before
+        self._dirty[:] = self._all_dirty
+        self._force = True
+
+    def __len__(self):
+        return self.n
+
+    def set(self, index, color):
+        """Set pixel `index` to an (r, g, b) color"""
+        buf = self.buf
+        offset = index * 3
+        buf[offset] = color[0]
+        buf[offset + 1] = color[1]
+        buf[offset + 2] = color[2]
+        self._dirty[index] = 1
+
+    def set_xy(self, x, y, color):
+        """Set the pixel at column x, row y"""
+        self.set(y * self.width + x, color)
+
+    def set_channel(self, index, channel, value):
+        """Set one channel (0 = red, 1 = green, 2 = blue) of a pixel"""
+        self.buf[index * 3 + channel] = value
+        self._dirty[index] = 1
+
+    def get(self, index):
+        """Get the (r, g, b) color of pixel `index`"""
+        offset = index * 3
+        buf = self.buf
+        return (buf[offset], buf[offset + 1], buf[offset + 2])
+
+    def get_xy(self, x, y):
+        return self.get(y * self.width + x)
+
+    def fill(self, color):
+        """Set every pixel to the same color"""
+        self.buf[:] = bytes((color[0], color[1], color[2])) * self.n
+        self._dirty[:] = self._all_dirty
+
+    def clear(self):
+        self.fill(BLACK)
+
+    def load(self, frame):
+        """Replace the whole picture with a flat RGB frame, 3 bytes per LED"""
+        self.buf[:] = frame
+        self._dirty[:] = self._all_dirty
+
+    def revert(self):
+        """Throw away everything drawn since the last present()"""
+        self.buf[:] = self._shown
+        self._dirty[:] = self._all_dirty if self._force else self._all_clean
+
+    def present(self):
+        """
+        Write the changed pixels to the LEDs and show them
+
+        Returns:
+            True if anything was written
+        """
+        buf = self.buf
+        shown = self._shown
+        dirty = self._dirty
+
+        force = self._force
+        if buf == shown and not force:
+            dirty[:] = self._all_clean
+            return False
+
+        pixels = self.pixels
+        index = dirty.find(1)
+        while index != -1:
+            offset = index * 3
+            r, g, b = buf[offset], buf[offset + 1], buf[offset + 2]
+            if force or r != shown[offset] or g != shown[offset + 1] or b != shown[offset + 2]:
+                pixels[index] = (r, g, b)
+            index = dirty.find(1, index + 1)
+
+        dirty[:] = self._all_clean
+        shown[:] = buf
+        self._force = False
+        pixels.show()
+        return True
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Matrix geometry.
+
+Modes draw on a logical grid: width x height pixels, row by row from the
+top left, so pixel (x, y) is index y * width + x. How those pixels are
+wired on the actual panel (serpentine rows, columns, rotation, several
+chained panels) is described once in config.json:
+
+    "matrix": {
+        "width": 32,             # Panel size in LEDs, as mounted before rotation
+        "height": 8,
+        "serpentine": true,      # Every other row (or column) runs backwards
+        "vertical": true,        # LEDs run down columns instead of along rows
+        "rotation": 0,           # 0, 90, 180 or 270 degrees clockwise
+        "tile_width": 8,         # Size of one chained panel (default: one panel)
+        "tile_height": 8,
+        "tile_serpentine": false # Every other row of panels runs backwards
+    }
+
+The mapping is precomputed into index tables, so converting a frame from
+logical to physical order is a single table lookup per pixel.
+"""
+
+from array import array
+
+ROTATIONS = (0, 90, 180, 270)
+
+
+class Geometry:
+    """Maps logical pixel positions to physical LED indices"""
+
+    def __init__(self, width=8, height=8, serpentine=False, vertical=False, rotation=0,
+                 tile_width=None, tile_height=None, tile_serpentine=False):
+        """
+        Initialize the geometry
+
+        Args:
+            width: Number of LEDs horizontally on the panel, before rotation
+            height: Number of LEDs vertically on the panel, before rotation
+            serpentine: Whether every other row (or column) is wired backwards
+            vertical: Whether the LEDs are wired along columns instead of rows
+            rotation: Clockwise rotation of the picture in degrees
+            tile_width: Width of one chained panel (defaults to width)
+            tile_height: Height of one chained panel (defaults to height)
+            tile_serpentine: Whether every other row of panels is chained backwards
+        """
+        tile_width = tile_width or width
+        tile_height = tile_height or height
+        if width <= 0 or height <= 0:
+            raise ValueError("Matrix width and height must be positive")
+        if width % tile_width or height % tile_height:
+            raise ValueError("Matrix size must be a whole number of tiles")
+        if rotation not in ROTATIONS:
+            raise ValueError(f"Rotation must be one of {ROTATIONS}")
+
+        self.panel_width = width
+        self.panel_height = height
+        self.serpentine = serpentine
+        self.vertical = vertical
+        self.rotation = rotation
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.tile_serpentine = tile_serpentine
+
+        # The logical grid is the picture as seen after rotation
+        if rotation in (90, 270):
+            self.width, self.height = height, width
+        else:
+            self.width, self.height = width, height
+        self.led_count = width * height
+
+        # index_map[logical] = physical, source_map[physical] = logical
+        self.index_map = array("I", bytes(4 * self.led_count))
+        self.source_map = array("I", bytes(4 * self.led_count))
+        for y in range(self.height):
+            for x in range(self.width):
+                logical = y * self.width + x
+                physical = self._physical_index(x, y)
+                self.index_map[logical] = physical
+                self.source_map[physical] = logical
+
+        self.identity = all(physical == logical for logical, physical in enumerate(self.index_map))
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the geometry from the "matrix" section of config.json"""
+        matrix = config.get("matrix") or {}
+        return cls(
+            width=matrix.get("width", 8),
+            height=matrix.get("height", 8),
+            serpentine=matrix.get("serpentine", False),
+            vertical=matrix.get("vertical", False),
+            rotation=matrix.get("rotation", 0),
+            tile_width=matrix.get("tile_width"),
+            tile_height=matrix.get("tile_height"),
+            tile_serpentine=matrix.get("tile_serpentine", False),
+        )
+
+    def index(self, x, y):
+        """Physical LED index of logical pixel (x, y)"""
+        return self.index_map[y * self.width + x]
+
+    def _physical_index(self, x, y):
+        """Work out the physical LED index of logical pixel (x, y)"""
+        # Position on the panel as mounted
+        w, h = self.panel_width, self.panel_height
+        if self.rotation == 90:
+            px, py = w - 1 - y, x
+        elif self.rotation == 180:
+            px, py = w - 1 - x, h - 1 - y
+        elif self.rotation == 270:
+            px, py = y, h - 1 - x
+        else:
+            px, py = x, y
+
+        # Which chained tile, and where on it
+        tw, th = self.tile_width, self.tile_height
+        tiles_x = w // tw
+        tx, ty = px // tw, py // th
+        if self.tile_serpentine and ty % 2:
+            tx = tiles_x - 1 - tx
+        tile = ty * tiles_x + tx
+        ix, iy = px % tw, py % th
+
+        # Position along the wiring of the tile
+        if self.vertical:
+            line, step, line_length = ix, iy, th
+        else:
+            line, step, line_length = iy, ix, tw
+        if self.serpentine and line % 2:
+            step = line_length - 1 - step
+
+        return tile * tw * th + line * line_length + step
+
+    def to_physical(self, colors):
+        """
+        Reorder a frame from logical to physical LED order
+
+        Args:
+            colors: List of colors in logical order
+
+        Returns:
+            List of colors in the order the LEDs are wired
+        """
+        if self.identity:
+            return colors
+        return [colors[logical] for logical in self.source_map]
+
+    def __repr__(self):
+        return f"Geometry({self.width}x{self.height}, {self.led_count} LEDs)"
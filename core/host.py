@@ -0,0 +1,696 @@
+#!/usr/bin/env python3
+"""
+Mode host.
+
+Opens the NeoPixel driver once and runs mode scripts on top of it. Modes
+still do `import neopixel` and create their own NeoPixel object, but they
+get a lightweight stand-in that draws into a shared framebuffer. A single
+driver thread owns the strip and pushes every committed frame to it, so
+switching modes never re-imports board/neopixel or re-initialises the DMA
+driver.
+
+Modes run either on a thread inside the supervisor ("thread" isolation, the
+default) or in a forked child process ("process" isolation), where a crash
+or hang of the mode can never take the driver down with it. Child processes
+come from a warm standby worker, forked ahead of time.
+
+Overlay layers (see core.compositor) are composited on top of the mode's
+frames by the driver thread, so they can be shown while the mode runs on.
+The driver thread also blends between modes on a switch (see
+core.transitions).
+"""
+
+import ctypes
+import importlib.util
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+import types
+
+from core.color import DEFAULT_GAMMA, ColorPipeline
+from core.metrics import Metrics
+from core.prefork import ForkServer, WarmWorker, import_common, preload_mode
+from core.recorder import Recorder
+from core.shm import SharedFramebuffer
+
+# Seconds to wait for a mode to unwind before it is detached (or killed)
+STOP_TIMEOUT = 2.0
+
+# Seconds between rewrites of an unchanged frame
+REFRESH_INTERVAL = 1.0
+# Seconds the driver waits after an error, so a persistent one doesn't spin
+DRIVER_ERROR_DELAY = 0.1
+
+_real_sleep = time.sleep
+_local = threading.local()
+
+
+class ModeExit(BaseException):
+    """
+    Raised inside a mode thread to stop it.
+
+    Derives from BaseException so the `except Exception` blocks used by the
+    modes don't swallow it.
+    """
+
+
+def _interruptible_sleep(seconds):
+    """time.sleep replacement that wakes up as soon as the host stops the mode"""
+    context = getattr(_local, "context", None)
+    if context is None:
+        _real_sleep(seconds)
+        return
+    started = time.monotonic()
+    stopped = context.stop_event.wait(seconds)
+    context.slept += time.monotonic() - started  # Not part of the frame time
+    if stopped:
+        raise ModeExit()
+
+
+class Strip:
+    """The physical LED strip, opened once and shared by every mode"""
+
+    def __init__(self, led_count, brightness=1.0, gamma=DEFAULT_GAMMA, geometry=None):
+        """
+        Open the strip
+
+        Args:
+            led_count: Number of LEDs
+            brightness: Brightness from 0.0 to 1.0
+            gamma: Gamma correction exponent
+            geometry: Geometry that maps the logical frames to the wiring
+        """
+        import board
+        import neopixel
+
+        self.n = led_count
+        self.geometry = geometry
+        # Brightness is applied by the color pipeline, so the driver never
+        # has to rescale the frame itself
+        self.color = ColorPipeline(gamma, brightness)
+        self.driver = neopixel.NeoPixel(
+            board.D18, led_count, brightness=1.0, auto_write=False
+        )
+        self.lock = threading.Lock()
+
+    @property
+    def brightness(self):
+        return self.color.brightness
+
+    @brightness.setter
+    def brightness(self, value):
+        self.color.brightness = value
+
+    @property
+    def gamma(self):
+        return self.color.gamma
+
+    @gamma.setter
+    def gamma(self, value):
+        self.color.gamma = value
+
+    def write(self, frame):
+        """
+        Push a frame to the LEDs
+
+        Args:
+            frame: Flat RGB bytes, 3 bytes per LED
+        """
+        frame = self.color.apply(frame[:self.n * 3])
+        channels = iter(frame)
+        colors = list(zip(channels, channels, channels))
+        if self.geometry is not None and len(colors) == self.geometry.led_count:
+            colors = self.geometry.to_physical(colors)
+        count = len(colors)
+        with self.lock:
+            self.driver[0:count] = colors
+            self.driver.show()
+
+    def clear(self):
+        """Turn all LEDs off"""
+        with self.lock:
+            self.driver.fill((0, 0, 0))
+            self.driver.show()
+
+
+class _ModeContext:
+    """Bookkeeping for one run of one mode"""
+
+    def __init__(self, name, script_path):
+        self.name = name
+        self.script_path = script_path
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.pid = None
+        self.worker = None  # WarmWorker running the mode, in process isolation
+        self.finished = False
+        self.slept = 0.0  # Seconds the mode spent in time.sleep
+
+    def check(self):
+        """Unwind the calling mode thread if the host asked it to stop"""
+        if self.stop_event.is_set():
+            raise ModeExit()
+
+
+class SharedPixels:
+    """
+    NeoPixel stand-in handed to modes running in the host.
+
+    Pixels are written straight into the back slot of the shared
+    framebuffer; show() commits it so the driver thread picks it up.
+    Brightness is owned by the supervisor (config.json / control socket),
+    so setting it here only changes the stored value.
+
+    show() also measures how long the mode computed the frame: the time
+    since the previous show(), minus the time it slept.
+    """
+
+    def __init__(self, framebuffer, n, brightness=1.0, auto_write=True, pixel_order=None,
+                 before_show=None, context=None):
+        if n > framebuffer.n:
+            raise ValueError(f"Mode asked for {n} LEDs, the strip has {framebuffer.n}")
+        self._fb = framebuffer
+        self._before_show = before_show
+        self._context = context
+        self._frame_start = None
+        self._slept = 0.0
+        self.n = n
+        self.auto_write = auto_write
+        self.pixel_order = pixel_order
+        self.brightness = brightness
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, index, val):
+        """Set a pixel color"""
+        if isinstance(index, slice):
+            indices = range(*index.indices(self.n))
+            if isinstance(val, (list, tuple)) and val and isinstance(val[0], (list, tuple)):
+                for i, color in zip(indices, val):
+                    self._set(i, color)
+            else:
+                for i in indices:
+                    self._set(i, val)
+        else:
+            if index < 0:
+                index += self.n
+            if not 0 <= index < self.n:
+                raise IndexError("pixel index out of range")
+            self._set(index, val)
+
+        if self.auto_write:
+            self.show()
+
+    def __getitem__(self, index):
+        """Get a pixel color"""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.n))]
+        if index < 0:
+            index += self.n
+        offset = index * 3
+        return tuple(self._fb.pixels[offset:offset + 3])
+
+    def _set(self, index, val):
+        if isinstance(val, int):
+            val = ((val >> 16) & 0xFF, (val >> 8) & 0xFF, val & 0xFF)
+        offset = index * 3
+        self._fb.pixels[offset:offset + 3] = bytes((int(val[0]), int(val[1]), int(val[2])))
+
+    def fill(self, color):
+        """Fill all pixels with the same color"""
+        if isinstance(color, int):
+            color = ((color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF)
+        self._fb.pixels[:self.n * 3] = bytes((int(color[0]), int(color[1]), int(color[2]))) * self.n
+        if self.auto_write:
+            self.show()
+
+    @property
+    def buffer(self):
+        """Writable view of the frame being drawn, 3 bytes per LED, until the next show()"""
+        return self._fb.pixels[:self.n * 3]
+
+    def show(self):
+        """Publish the current frame to the driver"""
+        if self._before_show:
+            self._before_show()
+
+        render_time = None
+        context = self._context
+        if context is not None:
+            now = time.monotonic()
+            if self._frame_start is not None:
+                render_time = now - self._frame_start - (context.slept - self._slept)
+            self._frame_start = now
+            self._slept = context.slept
+
+        self._fb.commit(render_time)
+
+
+class ModeHost:
+    """
+    Runs one mode at a time on top of a single open strip.
+
+    In "thread" isolation, stopping a mode sets its stop event: the next
+    sleep or show() in the mode raises ModeExit, which unwinds the mode's
+    own loop. In "process" isolation the mode's child process is
+    terminated. Either way the driver thread keeps showing the last frame.
+
+    preload() compiles the next mode and imports its dependencies ahead of
+    time (in the standby worker when using process isolation).
+    """
+
+    def __init__(self, strip, config_path, on_exit=None, isolation="thread", profile=None,
+                 profile_dir="profiles"):
+        """
+        Initialize the host
+
+        Args:
+            strip: Strip instance that owns the hardware
+            config_path: Path to config.json, exported to the modes as LEDMATRIX_CONFIG
+            on_exit: Optional callback, called with the mode name when a mode
+                exits on its own (not when it is stopped by the host)
+            isolation: "thread" to run modes inside this process, "process"
+                to fork a child process per mode
+            profile: Optional seconds to profile every mode for after it
+                starts (see core.profiling)
+            profile_dir: Directory to write the profiles to
+        """
+        if isolation not in ("thread", "process"):
+            raise ValueError(f"Unknown mode isolation: {isolation}")
+
+        self.strip = strip
+        self.config_path = config_path
+        self.on_exit = on_exit
+        self.isolation = isolation
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.framebuffer = SharedFramebuffer(strip.n)
+        self._current = None
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._blanked = False
+        self._redraw = False
+        self._compiled = {}
+        self._standby = None
+        self._fork_server = None
+        self.recorder = None
+        self.recording_error = None  # Why the last recording stopped by itself
+        self.metrics = Metrics()
+        self.compositor = None  # Created with the first layer
+        self.transition = None
+        self._switching = None  # Transition from the previous mode, while it runs
+        self._install()
+
+        if isolation == "process":
+            # Before the driver thread starts: workers are forked from here
+            import_common()
+            self._fork_server = ForkServer(self._run_in_child)
+            self._standby = WarmWorker(self._fork_server)
+
+        self._driver_thread = threading.Thread(target=self._drive, name="driver", daemon=True)
+        self._driver_thread.start()
+
+    def _install(self):
+        """Route `import neopixel` and time.sleep in modes through the host"""
+        import neopixel
+
+        shim = types.ModuleType("neopixel")
+        for name in ("RGB", "GRB", "RGBW", "GRBW"):
+            if hasattr(neopixel, name):
+                setattr(shim, name, getattr(neopixel, name))
+        shim.NeoPixel = self._attach
+        sys.modules["neopixel"] = shim
+
+        time.sleep = _interruptible_sleep
+        os.environ["LEDMATRIX_CONFIG"] = self.config_path
+
+    def _attach(self, pin, n, *, brightness=1.0, auto_write=True, pixel_order=None, **kwargs):
+        """NeoPixel factory used by modes running in the host"""
+        context = getattr(_local, "context", None)
+        if context is None:
+            raise RuntimeError("NeoPixel can only be created from a mode running in the host")
+
+        before_show = None
+        if self.isolation == "thread":
+            def before_show():
+                self._wait_resumed(context)
+
+        return SharedPixels(
+            self.framebuffer, n, brightness, auto_write, pixel_order, before_show, context
+        )
+
+    @property
+    def current(self):
+        """Name of the running mode, or None"""
+        context = self._current
+        if context and not context.finished:
+            return context.name
+        return None
+
+    def start(self, name, script_path):
+        """Stop the running mode (if any) and start another one"""
+        self.stop()
+
+        transition = self.transition
+        if transition is not None:
+            # Hold the outgoing mode's last frame until the new mode draws
+            outgoing = bytearray(self.framebuffer.frame_size)
+            seq = self.framebuffer.read(outgoing)
+            transition.begin(outgoing, seq)
+            self._switching = transition
+
+        context = _ModeContext(name, script_path)
+        self._current = context
+
+        if self.isolation == "process":
+            worker = self._standby or WarmWorker(self._fork_server)
+            worker.run(name, script_path)
+            context.pid = worker.pid
+            context.worker = worker
+            # Fork the next standby right away, while this mode starts up
+            self._standby = WarmWorker(self._fork_server)
+            target = self._reap
+        else:
+            target = self._run
+
+        context.thread = threading.Thread(
+            target=target, args=(context,), name=f"mode-{name}", daemon=True
+        )
+        context.thread.start()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Ask the running mode to stop and wait for it to unwind"""
+        context = self._current
+        if context is None:
+            return
+        self._current = None
+        context.stop_event.set()
+
+        if context.pid:
+            self._signal(context, signal.SIGTERM)
+            self._signal(context, signal.SIGCONT)
+
+        thread = context.thread
+        thread.join(timeout)
+        if not thread.is_alive():
+            return
+
+        if context.pid:
+            print(f"Mode {context.name} did not stop within {timeout}s, killing it")
+            self._signal(context, signal.SIGKILL)
+            thread.join()
+        else:
+            # Blocked outside sleep/show (e.g. waiting on a socket). Raise
+            # ModeExit asynchronously; it unwinds as soon as the thread runs
+            # Python code again.
+            print(f"Mode {context.name} did not stop within {timeout}s, detaching")
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                ctypes.c_ulong(thread.ident), ctypes.py_object(ModeExit)
+            )
+
+    def preload(self, script_path):
+        """Compile a mode and import its dependencies, so starting it is quick"""
+        if self._standby:
+            self._standby.preload(script_path)
+        else:
+            self._compiled[script_path] = preload_mode(script_path)
+
+    def close(self):
+        """Stop the running mode, the standby worker and any recording"""
+        self.stop()
+        self.stop_recording()
+        if self._standby:
+            self._standby.close()
+            self._standby = None
+        if self._fork_server:
+            self._fork_server.close()
+            self._fork_server = None
+
+    def wait(self, timeout=None):
+        """
+        Block until the running mode exits
+
+        Returns:
+            True if no mode is running anymore
+        """
+        context = self._current
+        if context is None:
+            return True
+        context.thread.join(timeout)
+        return not context.thread.is_alive()
+
+    @property
+    def paused(self):
+        return not self._resumed.is_set()
+
+    @property
+    def blanked(self):
+        return self._blanked
+
+    def pause(self):
+        """Freeze the running mode"""
+        self._resumed.clear()
+        context = self._current
+        if context and context.pid:
+            self._signal(context, signal.SIGSTOP)
+
+    def resume(self):
+        self._resumed.set()
+        context = self._current
+        if context and context.pid:
+            self._signal(context, signal.SIGCONT)
+
+    def blank(self):
+        """Turn the LEDs off; the mode keeps running but its frames are not shown"""
+        self._blanked = True
+        self._redraw = True
+        self.framebuffer.notify()
+
+    def unblank(self):
+        """Show the mode's frames again, starting with the latest one"""
+        self._blanked = False
+        self._redraw = True
+        self.framebuffer.notify()
+
+    def start_recording(self, path):
+        """Record every frame the modes show to a file (see core.recorder)"""
+        self.stop_recording()
+        self.recorder = Recorder(path, self.framebuffer.n)
+        self.recording_error = None
+        # Capture the frame on the LEDs right away, not only the next change
+        self._redraw = True
+        self.framebuffer.notify()
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def _recording_failed(self, recorder, error):
+        """Stop a recording that can't be written (disk full, SD card error)"""
+        print(f"Recording to {recorder.path} stopped: {error}")
+        self.recording_error = f"{recorder.path}: {error}"
+        if self.recorder is recorder:
+            self.recorder = None
+        try:
+            recorder.close()
+        except OSError:
+            pass  # The frames that didn't make it to disk are lost
+
+    @property
+    def layers(self):
+        """Names of the layers shown on top of the mode"""
+        return list(self.compositor.layers) if self.compositor else []
+
+    def set_layer(self, name, pixels, **kwargs):
+        """
+        Show a layer on top of the mode (see Compositor.set_layer)
+
+        Args:
+            name: Layer name, see core.compositor.LAYERS
+            pixels: Colors of the layer, one (r, g, b) per LED
+            **kwargs: mask, alpha, blend and duration
+        """
+        self._compositor().set_layer(name, pixels, **kwargs)
+        self._redraw = True
+        self.framebuffer.notify()
+
+    def remove_layer(self, name=None):
+        """Remove a layer, or every layer if name is None"""
+        if self.compositor:
+            self.compositor.remove_layer(name)
+            self._redraw = True
+            self.framebuffer.notify()
+
+    def set_mode_alpha(self, alpha):
+        """Fade the mode's own frame towards black, below the layers"""
+        self._compositor().mode_alpha = alpha
+        self._redraw = True
+        self.framebuffer.notify()
+
+    def set_transition(self, kind=None, duration=0.5):
+        """
+        Blend between modes when switching (see core.transitions)
+
+        Args:
+            kind: "fade", "wipe", or None to switch without a transition
+            duration: Seconds the transition takes
+        """
+        if kind is None:
+            self.transition = self._switching = None
+            return
+
+        from core.transitions import Transition  # Needs numpy
+
+        geometry = self.strip.geometry
+        width, height = (geometry.width, geometry.height) if geometry else (self.strip.n, 1)
+        self.transition = Transition(kind, duration, width, height)
+
+    def _compositor(self):
+        if self.compositor is None:
+            from core.compositor import Compositor  # Needs numpy
+            self.compositor = Compositor(self.framebuffer.n)
+        return self.compositor
+
+    def _wait_resumed(self, context):
+        """Hold a thread-isolated mode at show() while the host is paused"""
+        context.check()
+        while not self._resumed.wait(0.05):
+            context.check()
+
+    def _drive(self):
+        """Driver thread: push every committed frame to the strip"""
+        frame = bytearray(self.framebuffer.frame_size)
+        black = bytes(self.framebuffer.frame_size)
+        seq = None
+        last_write = 0.0
+        last_error = None
+
+        while True:
+            try:
+                timeout = REFRESH_INTERVAL
+                compositor = self.compositor
+                expiry = compositor.next_expiry() if compositor else None
+                if expiry is not None:
+                    # Wake up to take an expired layer off the LEDs
+                    timeout = max(0.0, min(timeout, expiry - time.monotonic()))
+                switching = self._switching
+                if switching is not None and switching.started is not None:
+                    timeout = min(timeout, switching.period)  # Step at the transition's rate
+                self.framebuffer.wait(timeout)
+
+                new_seq = self.framebuffer.read(frame, seq)
+                changed = new_seq is not None
+                now = time.monotonic()
+
+                context = self._current
+                stats = self.metrics.mode(context.name) if changed and context else None
+                if changed:
+                    committed = 1 if seq is None else (new_seq - seq) & 0xFFFFFFFF
+                    seq = new_seq
+                    if stats is not None:
+                        stats.committed(now, committed, self.framebuffer.render_time)
+
+                blending = False
+                if switching is not None:
+                    if changed and switching.started is None and new_seq != switching.outgoing_seq:
+                        switching.start(now)  # The incoming mode's first frame
+                    blending = switching.started is not None
+                    if switching.done(now) and self._switching is switching:
+                        self._switching = None
+
+                expired = expiry is not None and expiry <= now
+                if changed or blending or expired or self._redraw or now - last_write >= REFRESH_INTERVAL:
+                    self._redraw = False
+                    shown = frame
+                    if switching is not None:
+                        shown = switching.blend(frame, now)
+                    if compositor is not None and compositor.active:
+                        shown = compositor.compose(shown, now)
+                    self.strip.write(black if self._blanked else shown)
+                    last_write = now
+                    if stats is not None:
+                        stats.show.add(time.monotonic() - now)
+
+                    # The recorder skips frames that didn't change
+                    recorder = self.recorder
+                    if recorder is not None:
+                        try:
+                            recorder.write(shown, now)
+                        except OSError as e:
+                            self._recording_failed(recorder, e)
+            except Exception as e:
+                # The driver is the only thread writing the LEDs, so it must
+                # keep going; a repeating error is only logged once
+                if repr(e) != last_error:
+                    print("Error driving the LEDs")
+                    traceback.print_exc()
+                last_error = repr(e)
+                _real_sleep(DRIVER_ERROR_DELAY)
+            else:
+                last_error = None
+
+    def _run(self, context):
+        """Mode thread body: execute the mode script until it exits or is stopped"""
+        _local.context = context
+        try:
+            self._exec(context)
+        except ModeExit:
+            pass
+        except Exception:
+            print(f"Error running mode: {context.name}")
+            traceback.print_exc()
+        finally:
+            _local.context = None
+            self._finish(context)
+
+    def _exec(self, context, code=None):
+        """Execute a mode script; returns when the mode's main loop ends"""
+        self.framebuffer.attach_writer()
+        if self.profile:
+            from core.profiling import ModeProfiler
+
+            ModeProfiler(context.name, self.profile, self.profile_dir).start()
+        module_name = "led_mode_" + context.name.replace("-", "_")
+        code = code or self._compiled.pop(context.script_path, None)
+
+        if code is None:
+            spec = importlib.util.spec_from_file_location(module_name, context.script_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        else:
+            module = types.ModuleType(module_name)
+            module.__file__ = context.script_path
+            exec(code, module.__dict__)
+
+    def _run_in_child(self, name, script_path, code):
+        """Run a mode in a standby worker that got handed a mode"""
+        context = _ModeContext(name, script_path)
+        _local.context = context
+        try:
+            self._exec(context, code)
+            return 0
+        except BaseException:
+            print(f"Error running mode: {context.name}")
+            traceback.print_exc()
+            return 1
+
+    def _reap(self, context):
+        """Wait for a mode's child process to exit"""
+        context.worker.wait()
+        self._finish(context)
+
+    def _signal(self, context, signum):
+        try:
+            os.kill(context.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _finish(self, context):
+        context.finished = True
+        if context is self._current and self.on_exit:
+            self.on_exit(context.name)
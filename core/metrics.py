@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Frame timing metrics.
+
+The host's driver thread records, per mode, how long the mode spent
+computing each frame (update and render, without the time it slept), how
+long writing it to the LEDs took, the frame rate it achieved and how many
+frames it committed that never made it to the LEDs because the driver was
+still busy with an earlier one.
+
+Histograms keep cumulative bucket counts (for Prometheus) and the most
+recent samples (for percentiles and the rolling histogram in the control
+socket's `metrics` command). Adding a sample is a bisect and an append, so
+it is cheap enough to do for every frame.
+"""
+
+import bisect
+import os
+import threading
+from collections import deque
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+WINDOW = 256  # Recent frames kept for percentiles, rolling histograms and FPS
+
+TEXTFILE_INTERVAL = 15  # Seconds between Prometheus textfile updates
+
+
+class Histogram:
+    """Latency histogram with a rolling window of recent samples"""
+
+    def __init__(self, bounds=BUCKETS, window=WINDOW):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentile(self, q, recent=None):
+        """Value below which a fraction q of the recent samples fall, or None"""
+        ordered = sorted(self.snapshot() if recent is None else recent)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def rolling_counts(self, recent=None):
+        """Bucket counts over the recent samples only"""
+        counts = [0] * (len(self.bounds) + 1)
+        for value in self.snapshot() if recent is None else recent:
+            counts[bisect.bisect_left(self.bounds, value)] += 1
+        return counts
+
+    def snapshot(self):
+        """
+        A copy of the recent samples
+
+        The driver thread appends while the control socket and the textfile
+        exporter read; iterating the deque itself would raise if a sample
+        came in halfway, copying it is a single step under the GIL.
+        """
+        return list(self.recent)
+
+    def summary(self):
+        """Recent percentiles and rolling histogram in milliseconds, for JSON"""
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+
+        recent = self.snapshot()  # One set of samples for all figures
+        labels = [f"{bound * 1000:g}" for bound in self.bounds] + ["+Inf"]
+        return {
+            "p50_ms": ms(self.percentile(0.5, recent)),
+            "p95_ms": ms(self.percentile(0.95, recent)),
+            "max_ms": ms(max(recent) if recent else None),
+            "histogram_ms": dict(zip(labels, self.rolling_counts(recent))),
+        }
+
+
+class ModeStats:
+    """Frame timing of one mode"""
+
+    def __init__(self):
+        self.render = Histogram()  # Seconds computing a frame
+        self.show = Histogram()  # Seconds writing a frame to the LEDs
+        self.frames = 0  # Frames committed by the mode
+        self.dropped = 0  # Committed frames replaced before they were written
+        self._arrivals = deque(maxlen=WINDOW)  # (monotonic time, frames)
+
+    def committed(self, now, count, render_time=None):
+        """
+        Record new frames from the mode
+
+        Args:
+            now: time.monotonic() at which the driver picked them up
+            count: Frames committed since the previous pick-up; all but the
+                last one were never shown
+            render_time: Seconds the mode spent computing the last one
+        """
+        self.frames += count
+        self.dropped += count - 1
+        self._arrivals.append((now, self.frames))
+        if render_time is not None:
+            self.render.add(render_time)
+
+    @property
+    def fps(self):
+        """Frames per second the mode committed recently, or None"""
+        if len(self._arrivals) < 2:
+            return None
+        (first_time, first_frames), (last_time, last_frames) = self._arrivals[0], self._arrivals[-1]
+        if last_time <= first_time:
+            return None
+        return (last_frames - first_frames) / (last_time - first_time)
+
+    def snapshot(self):
+        fps = self.fps
+        return {
+            "fps": None if fps is None else round(fps, 2),
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "render": self.render.summary(),
+            "show": self.show.summary(),
+        }
+
+
+class Metrics:
+    """Frame timing per mode"""
+
+    def __init__(self):
+        self.modes = {}
+        self._lock = threading.Lock()
+
+    def mode(self, name):
+        """The stats of a mode, created on first use"""
+        stats = self.modes.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self.modes.setdefault(name, ModeStats())
+        return stats
+
+    def snapshot(self):
+        return {name: stats.snapshot() for name, stats in list(self.modes.items())}
+
+    def prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        modes = sorted(list(self.modes.items()))
+
+        for metric, attribute, description in (
+            ("ledmatrix_render_seconds", "render", "Time a mode spent computing a frame"),
+            ("ledmatrix_show_seconds", "show", "Time writing a frame to the LEDs"),
+        ):
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, stats in modes:
+                histogram = getattr(stats, attribute)
+                cumulative = 0
+                for bound, count in zip(list(histogram.bounds) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else f"{bound:g}"
+                    lines.append(f'{metric}_bucket{{mode="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{mode="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{{mode="{name}"}} {histogram.count}')
+
+        for metric, kind, description, value in (
+            ("ledmatrix_frames_total", "counter", "Frames committed by a mode", lambda s: s.frames),
+            ("ledmatrix_dropped_frames_total", "counter", "Frames replaced before they were shown",
+             lambda s: s.dropped),
+            ("ledmatrix_fps", "gauge", "Recent frames per second of a mode", lambda s: s.fps),
+        ):
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, stats in modes:
+                number = value(stats)
+                if number is not None:
+                    lines.append(f'{metric}{{mode="{name}"}} {number:g}')
+
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Write the metrics for node_exporter's textfile collector"""
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            f.write(self.prometheus())
+        os.replace(temporary, path)  # The collector never sees a half written file
+
+
+class TextfileExporter:
+    """Rewrites a Prometheus textfile every few seconds"""
+
+    def __init__(self, metrics, path, interval=TEXTFILE_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.metrics.write_textfile(self.path)
+            except OSError as e:
+                print(f"Could not write metrics to {self.path}: {e}")
+            self._stop.wait(self.interval)
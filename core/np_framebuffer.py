@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+NumPy framebuffer for vectorized modes.
+
+For modes that redraw or fade the whole picture every frame, where a
+Python loop over every pixel gets slow on larger chained panels. The
+picture is a (height, width, 3) uint8 array, so whole-frame operations
+(fill, blit, fade, blend, scale) are single NumPy calls:
+
+    fb = NumpyFramebuffer(pixels, WIDTH, HEIGHT)
+    fb.fade(8)
+    fb.array[y, x] = (255, 0, 0)
+    fb.present()
+
+When the mode runs in the host, the array is a view on the shared memory
+slot the driver reads from, so present() hands the frame over without
+copying it. Elsewhere (the visualizer) only the changed pixels are written
+to the NeoPixel object.
+
+Requires numpy, which the modes that use this module depend on.
+"""
+
+import numpy as np
+
+
+class Canvas:
+    """A (height, width, 3) uint8 picture with vectorized drawing operations"""
+
+    def __init__(self, width=8, height=8, array=None):
+        """
+        Initialize the canvas
+
+        Args:
+            width: Number of pixels horizontally
+            height: Number of pixels vertically
+            array: Optional existing (height, width, 3) uint8 array to draw into
+        """
+        self.width = width
+        self.height = height
+        self.array = np.zeros((height, width, 3), np.uint8) if array is None else array
+        self._work = np.empty((height, width, 3), np.float32)
+
+    @property
+    def flat(self):
+        """The pixels as an (n, 3) view, indexed like LEDs (y * width + x)"""
+        return self.array.reshape(-1, 3)
+
+    def fill(self, color):
+        self.array[:] = color
+
+    def clear(self):
+        self.array.fill(0)
+
+    def set_xy(self, x, y, color):
+        self.array[y, x] = color
+
+    def get_xy(self, x, y):
+        r, g, b = self.array[y, x]
+        return (int(r), int(g), int(b))
+
+    def blit(self, source, x=0, y=0):
+        """
+        Copy a picture onto the canvas, clipped to its edges
+
+        Args:
+            source: Canvas or (h, w, 3) array
+            x: Column of the top-left corner of source on this canvas
+            y: Row of the top-left corner of source on this canvas
+        """
+        source = source.array if isinstance(source, Canvas) else source
+        h, w = source.shape[:2]
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + w, self.width), min(y + h, self.height)
+        if left >= right or top >= bottom:
+            return
+        self.array[top:bottom, left:right] = source[top - y:bottom - y, left - x:right - x]
+
+    def fade(self, amount):
+        """Lower every channel by amount, stopping at 0"""
+        np.subtract(self.array, np.minimum(self.array, amount), out=self.array)
+
+    def scale(self, factor):
+        """Multiply every channel by factor, clipped to 0-255"""
+        np.multiply(self.array, factor, out=self._work)
+        np.clip(self._work, 0, 255, out=self._work)
+        self.array[:] = self._work
+
+    def blend(self, other, alpha):
+        """
+        Mix another picture into the canvas
+
+        Args:
+            other: Canvas or (height, width, 3) array
+            alpha: Weight of other, from 0.0 (keep this canvas) to 1.0 (take other)
+        """
+        other = other.array if isinstance(other, Canvas) else other
+        np.multiply(self.array, 1.0 - alpha, out=self._work)
+        self._work += other * np.float32(alpha)
+        np.clip(self._work, 0, 255, out=self._work)
+        self.array[:] = self._work
+
+
+class NumpyFramebuffer(Canvas):
+    """Canvas in front of a NeoPixel object"""
+
+    def __init__(self, pixels, width=8, height=8):
+        """
+        Initialize the framebuffer
+
+        Args:
+            pixels: NeoPixel object to present to (use auto_write=False)
+            width: Number of LEDs horizontally
+            height: Number of LEDs vertically
+        """
+        self.pixels = pixels
+        self.n = width * height
+        # The host's NeoPixel stand-in exposes its frame memory to draw in directly
+        self._zero_copy = getattr(pixels, "buffer", None) is not None
+        super().__init__(width, height, self._frame_view(width, height) if self._zero_copy else None)
+
+        # What the LEDs currently show; the first present() always writes
+        self._shown = np.zeros_like(self.array)
+        self._force = True
+
+    def _frame_view(self, width, height):
+        """The frame memory of the NeoPixel stand-in, as an array"""
+        return np.frombuffer(self.pixels.buffer, np.uint8).reshape(height, width, 3)
+
+    def present(self):
+        """
+        Show the picture on the LEDs
+
+        With the host's NeoPixel stand-in the array is the frame memory the
+        driver reads, so this only publishes it. Don't hold on to fb.array
+        across present(): it points at a fresh slot afterwards.
+
+        Returns:
+            True if anything was written
+        """
+        if not self._force and np.array_equal(self.array, self._shown):
+            return False
+
+        if self._zero_copy:
+            self._shown[:] = self.array
+            self.pixels.show()
+            # The next frame is drawn in the other slot, which starts as a copy of this one
+            self.array = self._frame_view(self.width, self.height)
+        else:
+            flat = self.flat
+            if self._force:
+                changed = range(self.n)
+            else:
+                changed = np.flatnonzero((flat != self._shown.reshape(-1, 3)).any(axis=1)).tolist()
+            for index in changed:
+                r, g, b = flat[index]
+                self.pixels[index] = (int(r), int(g), int(b))
+            self._shown[:] = self.array
+            self.pixels.show()
+
+        self._force = False
+        return True
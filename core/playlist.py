@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Mode playlist.
+
+Rotates through modes, each for its own duration, optionally limited to a
+time-of-day window. For example clock during work hours, led-sort in the
+evening and pathfinder in between:
+
+    "playlist": [
+        {"mode": "clock", "duration": 1800, "from": "09:00", "until": "17:00"},
+        {"mode": "led-sort", "duration": 600, "from": "17:00", "until": "23:00"},
+        {"mode": "pathfinder", "duration": 300}
+    ]
+
+Deadlines are kept in a heap on the monotonic clock, so switches land on
+time regardless of how long the supervisor was busy or whether the wall
+clock gets adjusted in between.
+"""
+
+import heapq
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_DURATION = 300  # Seconds an entry runs when it has no duration
+DAY = 24 * 60 * 60
+
+
+def _parse_time(value):
+    """Parse "HH:MM" or "HH:MM:SS" into seconds since midnight"""
+    parts = [int(part) for part in value.split(":")]
+    if len(parts) == 2:
+        parts.append(0)
+    hours, minutes, seconds = parts
+    if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        raise ValueError(f"Invalid time of day: {value}")
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _seconds_since_midnight(now):
+    return now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
+
+
+class PlaylistEntry:
+    """One mode in the playlist"""
+
+    def __init__(self, mode, duration=DEFAULT_DURATION, start=None, end=None):
+        """
+        Initialize the entry
+
+        Args:
+            mode: Mode name
+            duration: Seconds to run the mode each time it comes up
+            start: Optional "HH:MM" from which the entry may run
+            end: Optional "HH:MM" until which the entry may run (may be past midnight)
+        """
+        if duration <= 0:
+            raise ValueError(f"Duration of {mode} must be positive")
+        self.mode = mode
+        self.duration = duration
+        self.start = _parse_time(start) if start else None
+        self.end = _parse_time(end) if end else None
+
+    def _window(self):
+        return (self.start or 0, DAY if self.end is None else self.end)
+
+    def is_active(self, now):
+        """Whether the entry may run at the given datetime"""
+        if self.start is None and self.end is None:
+            return True
+        start, end = self._window()
+        t = _seconds_since_midnight(now)
+        if start <= end:
+            return start <= t < end
+        return t >= start or t < end  # Window wraps past midnight
+
+    def seconds_until_end(self, now):
+        """Seconds until the window closes, or None without a window end"""
+        if self.end is None:
+            return None
+        return (self.end - _seconds_since_midnight(now)) % DAY or DAY
+
+    def seconds_until_start(self, now):
+        """Seconds until the window opens next"""
+        start, _ = self._window()
+        return (start - _seconds_since_midnight(now)) % DAY
+
+
+class Playlist:
+    """Picks the mode to run and tracks when to switch to the next one"""
+
+    def __init__(self, entries):
+        if not entries:
+            raise ValueError("Playlist is empty")
+        self.entries = entries
+        self.index = -1
+        self._deadlines = []  # heap of monotonic deadlines
+
+    @classmethod
+    def from_config(cls, items):
+        """Build a playlist from the "playlist" list in config.json"""
+        return cls([
+            PlaylistEntry(
+                item["mode"],
+                item.get("duration", DEFAULT_DURATION),
+                item.get("from"),
+                item.get("until"),
+            )
+            for item in items
+        ])
+
+    @property
+    def current(self):
+        """The running entry, or None if no entry's window is open"""
+        if self.index < 0:
+            return None
+        return self.entries[self.index]
+
+    def advance(self, now=None, monotonic=None):
+        """
+        Move on to the next entry whose window is open
+
+        Args:
+            now: Current datetime (defaults to datetime.now())
+            monotonic: Current time.monotonic() value
+
+        Returns:
+            The new current entry, or None if no window is open right now
+        """
+        now = now or datetime.now()
+        monotonic = time.monotonic() if monotonic is None else monotonic
+        self._deadlines = []
+
+        count = len(self.entries)
+        for step in range(1, count + 1):
+            index = (self.index + step) % count
+            entry = self.entries[index]
+            if entry.is_active(now):
+                self.index = index
+                heapq.heappush(self._deadlines, monotonic + entry.duration)
+                remaining = entry.seconds_until_end(now)
+                if remaining is not None:
+                    heapq.heappush(self._deadlines, monotonic + remaining)
+                return entry
+
+        # Nothing may run now: check again when the first window opens
+        self.index = -1
+        heapq.heappush(
+            self._deadlines,
+            monotonic + min(entry.seconds_until_start(now) for entry in self.entries),
+        )
+        return None
+
+    def time_until_next(self, monotonic=None):
+        """Seconds until the next switch is due (never negative)"""
+        if not self._deadlines:
+            return None
+        monotonic = time.monotonic() if monotonic is None else monotonic
+        return max(0.0, self._deadlines[0] - monotonic)
+
+    def due(self, monotonic=None):
+        """Whether the earliest deadline has passed"""
+        return self.time_until_next(monotonic) == 0.0
+
+    def upcoming(self, now=None, monotonic=None):
+        """The entry expected to run after the current one, or None"""
+        delay = self.time_until_next(monotonic)
+        if delay is None:
+            return None
+        then = (now or datetime.now()) + timedelta(seconds=delay)
+
+        count = len(self.entries)
+        for step in range(1, count + 1):
+            entry = self.entries[(self.index + step) % count]
+            if entry.is_active(then):
+                return entry
+        return None
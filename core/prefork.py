@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Warm standby workers.
+
+Forking a fresh child for every mode switch still leaves the mode to
+compile its script and import everything it needs, which takes seconds on
+a Pi Zero for modes like pathfinder or ntfy-sh. A warm worker is forked
+ahead of time, inheriting the supervisor's already imported modules
+(board, neopixel, json, ...), and then waits for a mode to run. It can
+also pre-import the next scheduled mode, so the handoff is fork-and-go.
+
+Workers are not forked from the supervisor itself. By the time a mode
+switches, it runs the driver, control and config watcher threads, and a
+child forked while one of them holds a lock (the stdout buffer, the import
+lock) would deadlock on its first print or import. A fork server is forked
+once, while the supervisor has no other threads yet, and forks every
+worker from there. Workers are the fork server's children, so the
+supervisor learns that one exited through a pipe instead of waitpid().
+"""
+
+import ast
+import importlib
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+import traceback
+
+# Imported once in the supervisor, so every forked worker inherits them
+COMMON_IMPORTS = ("datetime", "json", "math", "random", "typing")
+
+# Provided by the host, never imported for real by a mode
+_HOST_MODULES = ("board", "neopixel")
+
+
+def import_common():
+    """Import the modules most modes use, before forking any worker"""
+    for name in COMMON_IMPORTS:
+        importlib.import_module(name)
+
+
+def _imported_modules(tree):
+    """Names of the modules a mode imports at its top level"""
+    names = []
+    nodes = list(tree.body)
+    while nodes:
+        node = nodes.pop(0)
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.append(node.module)
+        elif isinstance(node, (ast.Try, ast.If)):
+            # e.g. pathfinder's `try: import board` block
+            nodes.extend(node.body)
+    return [name for name in names if name.split(".")[0] not in _HOST_MODULES]
+
+
+def preload_mode(script_path):
+    """
+    Compile a mode script and import its dependencies, without running it
+
+    Args:
+        script_path: Path to the mode's main.py
+
+    Returns:
+        The compiled code object, ready to be executed
+    """
+    with open(script_path) as f:
+        source = f.read()
+    tree = ast.parse(source, script_path)
+
+    # Modes import their own helper modules (e.g. pathfinder's maze.py)
+    mode_dir = os.path.dirname(os.path.abspath(script_path))
+    sys.path.insert(0, mode_dir)
+    try:
+        for name in _imported_modules(tree):
+            try:
+                importlib.import_module(name)
+            except Exception:
+                pass  # The mode reports it properly when it runs
+    finally:
+        sys.path.remove(mode_dir)
+
+    return compile(tree, script_path, "exec")
+
+
+_PID = struct.Struct("<i")
+
+
+class ForkServer:
+    """A child process without threads that forks the warm workers"""
+
+    def __init__(self, run):
+        """
+        Fork the server; do this before the supervisor starts any thread
+
+        Args:
+            run: Called in a worker as run(name, script_path, code) to run
+                the mode; code is None if the mode was not preloaded. Must
+                return the worker's exit code.
+        """
+        self._lock = threading.Lock()
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        pid = os.fork()
+        if pid == 0:
+            ours.close()
+            self._serve(theirs, run)
+
+        theirs.close()
+        self.pid = pid
+        self._socket = ours
+
+    def fork(self):
+        """
+        Fork a worker
+
+        Returns:
+            (pid, command fd, exit fd) tuple; the exit fd reads end of file
+            once the worker exited
+        """
+        with self._lock:
+            self._socket.sendall(b"f")
+            data, fds, _, _ = socket.recv_fds(self._socket, _PID.size, 2)
+        if len(fds) != 2:
+            raise RuntimeError("The fork server is gone")
+        return _PID.unpack(data)[0], fds[0], fds[1]
+
+    def close(self):
+        """Stop the server; workers that run a mode keep running"""
+        self._socket.close()
+        try:
+            os.waitpid(self.pid, 0)
+        except ChildProcessError:
+            pass
+
+    @staticmethod
+    def _serve(sock, run):
+        """Child: fork a worker for every request, until the supervisor goes away"""
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # Reap the workers
+
+            while sock.recv(1):
+                command_r, command_w = os.pipe()
+                exit_r, exit_w = os.pipe()
+                pid = os.fork()
+                if pid == 0:
+                    # The write end of the exit pipe stays open until the worker exits
+                    sock.close()
+                    os.close(command_w)
+                    os.close(exit_r)
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    WarmWorker._serve(run, command_r)
+
+                os.close(command_r)
+                os.close(exit_w)
+                socket.send_fds(sock, [_PID.pack(pid)], [command_w, exit_r])
+                os.close(command_w)
+                os.close(exit_r)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+
+class WarmWorker:
+    """A forked child process waiting to run a mode"""
+
+    def __init__(self, server):
+        """
+        Fork the worker
+
+        Args:
+            server: ForkServer to fork it from
+        """
+        self.pid, command_fd, self._exit_fd = server.fork()
+        self._commands = os.fdopen(command_fd, "w", buffering=1)
+
+    def preload(self, script_path):
+        """Pre-import a mode, so running it later is fork-and-go"""
+        self._send({"cmd": "preload", "path": script_path})
+
+    def run(self, name, script_path):
+        """Hand a mode to the worker; from now on the worker is that mode's process"""
+        self._send({"cmd": "run", "name": name, "path": script_path})
+        self._commands.close()
+
+    def close(self):
+        """Stop a worker that never got a mode to run"""
+        if not self._commands.closed:
+            self._commands.close()
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        self.wait()
+
+    def wait(self):
+        """Block until the worker exited"""
+        if self._exit_fd is None:
+            return
+        while os.read(self._exit_fd, 1):
+            pass
+        os.close(self._exit_fd)
+        self._exit_fd = None
+
+    def _send(self, message):
+        self._commands.write(json.dumps(message) + "\n")
+
+    @staticmethod
+    def _serve(run, read_fd):
+        """Child: wait for commands until asked to run a mode, then exit"""
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+            preloaded = {}
+            with os.fdopen(read_fd) as commands:
+                # Ends when the supervisor closes the pipe or goes away
+                for line in commands:
+                    message = json.loads(line)
+                    if message["cmd"] == "preload":
+                        try:
+                            preloaded[message["path"]] = preload_mode(message["path"])
+                        except Exception:
+                            traceback.print_exc()
+                    elif message["cmd"] == "run":
+                        path = message["path"]
+                        code = run(message["name"], path, preloaded.get(path))
+                        break
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Sampling profiler for modes.
+
+A background thread looks at the mode thread's stack every few
+milliseconds (sys._current_frames()) and counts how often every call stack
+was seen. That costs the mode next to nothing, unlike cProfile, which hooks
+every call and only sees the thread it was enabled in.
+
+The result is written in the collapsed stack format, one line per stack:
+
+    main.py:<module>;main.py:fight;main.py:count_color 412
+
+which flamegraph.pl, speedscope and inferno turn into a flame graph. The
+functions the mode spent most of its time in are printed as well.
+
+Most modes spend most of their time asleep between frames, so a sample
+taken while the thread waits is counted as idle and left out of the
+stacks; the percentages are of the time the mode was actually working. A
+sample is idle when the thread used (almost) no CPU since the previous
+one, or when its innermost Python function is a known wait.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_INTERVAL = 0.005  # Seconds between samples
+TOP_FUNCTIONS = 10  # Functions printed after profiling
+IDLE_CPU = 0.1  # Part of an interval a thread must have run to not be idle
+
+# Innermost functions of a thread that is waiting, not working
+WAITS = {
+    "threading.py:wait",  # Event.wait, Condition.wait
+    "selectors.py:select",
+    "host.py:_interruptible_sleep",
+    "shm.py:wait",
+    "frame_clock.py:tick",
+    "virtual_clock.py:sleep",
+    "virtual_clock.py:_follow",
+}
+
+
+def _label(code):
+    """Stack frame label: the file (with the mode's directory) and the function"""
+    path = code.co_filename
+    parent = os.path.basename(os.path.dirname(path))
+    name = os.path.basename(path)
+    if name == "main.py" and parent:
+        name = f"{parent}/{name}"  # Every mode is a main.py
+    return f"{name}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Samples the call stack of one thread"""
+
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL):
+        """
+        Initialize the profiler
+
+        Args:
+            thread_id: Ident of the thread to sample (defaults to the calling thread)
+            interval: Seconds between samples
+        """
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle = 0
+        try:
+            self._clock = time.pthread_getcpuclockid(self.thread_id)
+        except (AttributeError, OSError):
+            self._clock = None  # Only the known waits count as idle
+        self._cpu = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampler to finish"""
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.sample():
+                break  # The thread is gone
+
+    def sample(self):
+        """
+        Record the thread's current stack
+
+        Returns:
+            False if the thread doesn't exist anymore
+        """
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return False
+        self.samples += 1
+        if self._waiting(frame):
+            self.idle += 1
+            return True
+        stack = []
+        while frame is not None:
+            stack.append(_label(frame.f_code))
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+        return True
+
+    def _waiting(self, frame):
+        """True if the thread is asleep rather than working"""
+        idle = False
+        if self._clock is not None:
+            try:
+                cpu = time.clock_gettime(self._clock)
+            except OSError:
+                cpu = None
+            if self._cpu is not None and cpu is not None:
+                idle = cpu - self._cpu < self.interval * IDLE_CPU
+            self._cpu = cpu
+        return idle or _label(frame.f_code) in WAITS
+
+    def collapsed(self):
+        """The samples in the collapsed stack format"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, n=TOP_FUNCTIONS):
+        """
+        The functions seen most often at the top of the stack
+
+        Returns:
+            List of (function, fraction of the busy samples)
+        """
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rpartition(";")[2]] += count
+        busy = self.samples - self.idle
+        return [(name, count / busy) for name, count in leaves.most_common(n)]
+
+
+class ModeProfiler:
+    """Profiles a mode for a number of seconds and writes the result"""
+
+    def __init__(self, name, seconds, directory, thread_id=None):
+        """
+        Initialize the profiler
+
+        Args:
+            name: Mode name, used in the file name
+            seconds: Seconds to profile for (or until the mode stops)
+            directory: Directory to write <mode>-<time>.folded to
+            thread_id: Ident of the mode's thread (defaults to the calling thread)
+        """
+        self.name = name
+        self.seconds = seconds
+        self.directory = directory
+        self.path = None
+        self.profiler = SamplingProfiler(thread_id)
+        self._thread = threading.Thread(target=self._run, name="profile", daemon=True)
+
+    def start(self):
+        self.profiler.start()
+        self._thread.start()
+
+    def finish(self):
+        """Stop profiling now and wait until the result is written"""
+        self.profiler.stop()
+        self._thread.join()
+
+    def _run(self):
+        # Not time.sleep, which the host or a virtual clock may have replaced
+        sampler = self.profiler._thread
+        sampler.join(self.seconds)
+        self.profiler.stop()
+        self.write()
+
+    def write(self):
+        """Write the collapsed stacks and print the top functions"""
+        profiler = self.profiler
+        if not profiler.samples:
+            print(f"Profile of {self.name}: no samples")
+            return
+        idle = profiler.idle / profiler.samples
+        if not profiler.stacks:
+            print(f"Profile of {self.name}: {profiler.samples} samples, all idle (nothing written)")
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(self.directory, f"{self.name}-{stamp}.folded")
+        with open(self.path, "w") as f:
+            f.write(profiler.collapsed())
+
+        print(f"Profile of {self.name}: {profiler.samples} samples ({idle:.0%} idle), "
+              f"busy ones written to {self.path}")
+        for function, fraction in profiler.top():
+            print(f"  {fraction:6.1%}  {function}")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Frame recorder.
+
+Captures what a mode displays into a compact binary file, appending a
+timestamped record for every frame that changed.
+
+File layout (little endian):
+
+    header  4s  magic (b"LEDR")
+            B   format version
+            x   padding
+            H   LED count
+            d   wall clock time the recording started (Unix seconds)
+
+    record  I   milliseconds since the recording started
+            B   record type: KEY_FRAME, DELTA_FRAME or END
+            H   payload length in bytes
+            ... payload
+
+A key frame payload is the full frame, 3 bytes (RGB) per LED, so 192 bytes
+for the 8x8 matrix. A delta frame payload is a list of runs against the
+previous frame, each an H count of unchanged LEDs to skip, an H count of
+changed LEDs and their RGB bytes; unchanged LEDs at the end are left out.
+A key frame is written every KEY_FRAME_INTERVAL records, and whenever a delta
+wouldn't be smaller, so playback can start at any key frame. Closing the
+recording writes an END record without payload, at the time the last
+frame stopped being shown; a recording that was cut off has none.
+
+Records are collected in memory and written to disk in bulk, so recording
+costs about one buffer copy per frame. Recording reads a file back through
+mmap. The records are indexed once when the file is opened, so decoding a
+frame is only copying its runs out of one view into one reused buffer.
+"""
+
+import mmap
+import os
+from array import array
+import struct
+import threading
+import time
+
+MAGIC = b"LEDR"
+VERSION = 1
+HEADER = struct.Struct("<4sBxHd")
+RECORD = struct.Struct("<IBH")
+RUN = struct.Struct("<HH")
+
+KEY_FRAME = 0
+DELTA_FRAME = 1
+END = 2
+
+KEY_FRAME_INTERVAL = 256  # Records between key frames
+FLUSH_SIZE = 64 * 1024  # Bytes collected before writing to disk
+
+
+class Recorder:
+    """Appends frames to a recording file"""
+
+    def __init__(self, path, led_count, flush_size=FLUSH_SIZE, start=None):
+        """
+        Create the recording
+
+        Args:
+            path: File to write; replaced if it exists
+            led_count: Number of LEDs in a frame
+            flush_size: Bytes to collect before writing them to disk
+            start: time.monotonic() the timestamps count from (defaults to now)
+        """
+        self.path = path
+        self.led_count = led_count
+        self.frame_size = led_count * 3
+        self.flush_size = flush_size
+        self.frames = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "wb", buffering=0)
+        self._buffer = bytearray(HEADER.pack(MAGIC, VERSION, led_count, time.time()))
+        self._previous = bytearray(self.frame_size)
+        self._delta = bytearray()
+        self._since_key = KEY_FRAME_INTERVAL  # First frame is a key frame
+        self._start = time.monotonic() if start is None else start
+        self._lock = threading.Lock()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def write(self, frame, timestamp=None):
+        """
+        Record a frame, unless it equals the previous one
+
+        Args:
+            frame: Flat RGB bytes, 3 bytes per LED
+            timestamp: time.monotonic() the frame was shown (defaults to now)
+        """
+        if len(frame) != self.frame_size:
+            raise ValueError(f"Frame is {len(frame)} bytes, expected {self.frame_size}")
+
+        with self._lock:
+            if self._file.closed:
+                return
+            if self.frames and frame == self._previous:
+                return
+
+            timestamp = time.monotonic() if timestamp is None else timestamp
+            ms = max(0, int((timestamp - self._start) * 1000)) & 0xFFFFFFFF
+
+            delta = None
+            if self._since_key < KEY_FRAME_INTERVAL:
+                delta = self._encode_delta(frame)
+
+            buffer = self._buffer
+            if delta is not None and len(delta) < self.frame_size:
+                buffer += RECORD.pack(ms, DELTA_FRAME, len(delta))
+                buffer += delta
+                self._since_key += 1
+            else:
+                buffer += RECORD.pack(ms, KEY_FRAME, self.frame_size)
+                buffer += frame
+                self._since_key = 0
+
+            self._previous[:] = frame
+            self.frames += 1
+            if len(buffer) >= self.flush_size:
+                self._flush()
+
+    def close(self, timestamp=None):
+        """
+        Write what is left and close the file
+
+        Args:
+            timestamp: time.monotonic() the last frame stopped being shown
+                (defaults to now)
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            timestamp = time.monotonic() if timestamp is None else timestamp
+            ms = max(0, int((timestamp - self._start) * 1000)) & 0xFFFFFFFF
+            self._buffer += RECORD.pack(ms, END, 0)
+            try:
+                self._flush()
+            finally:
+                self._file.close()
+
+    def _flush(self):
+        self._file.write(self._buffer)
+        self._buffer.clear()
+
+    def _encode_delta(self, frame):
+        """Runs of changed LEDs against the previous frame"""
+        delta = self._delta
+        delta.clear()
+        previous = self._previous
+        n = self.led_count
+
+        index = 0
+        while index < n:
+            start = index
+            while index < n and frame[index * 3:index * 3 + 3] == previous[index * 3:index * 3 + 3]:
+                index += 1
+            if index == n:
+                break
+            skip = index - start
+
+            start = index
+            while index < n and frame[index * 3:index * 3 + 3] != previous[index * 3:index * 3 + 3]:
+                index += 1
+            delta += RUN.pack(skip, index - start)
+            delta += frame[start * 3:index * 3]
+
+        return delta
+
+
+class Recording:
+    """Reads a recording file through mmap"""
+
+    def __init__(self, path):
+        """
+        Open a recording
+
+        Args:
+            path: File written by Recorder
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        if len(self._mmap) < HEADER.size:
+            self.close()
+            raise ValueError(f"Not a recording: {path}")
+        magic, version, led_count, started = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Not a recording, or an unsupported version: {path}")
+
+        self.led_count = led_count
+        self.frame_size = led_count * 3
+        self.started = started
+        self.end = None  # Seconds the last frame stopped being shown, if recorded
+
+        self._times = array("L")  # Milliseconds per frame
+        self._ends = array("L")  # Per frame, the end of its copies in _copies
+        self._copies = array("L")  # Frame offset, file offset and size per copy
+        try:
+            self._index()
+        except ValueError:
+            self.close()
+            raise
+
+    @property
+    def duration(self):
+        """Seconds from the start to the end of the last frame"""
+        if self.end is not None:
+            return self.end
+        return self._times[-1] / 1000 if self._times else 0.0
+
+    def _index(self):
+        """Walk the records once, turning every frame into a list of copies"""
+        data = self._mmap
+        end = len(data)
+        frame_size = self.frame_size
+        copies = self._copies
+        offset = HEADER.size
+        while offset + RECORD.size <= end:
+            ms, kind, length = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            payload_end = offset + length
+            if payload_end > end:
+                return  # Cut off, e.g. still being recorded
+            if kind == END:
+                self.end = ms / 1000
+                return
+
+            if kind == KEY_FRAME:
+                if length != frame_size:
+                    raise ValueError(f"Corrupt key frame in {self.path}")
+                copies.extend((0, offset, frame_size))
+            else:
+                led = 0
+                while offset < payload_end:
+                    skip, count = RUN.unpack_from(data, offset)
+                    offset += RUN.size
+                    start = (led + skip) * 3
+                    size = count * 3
+                    if start + size > frame_size or offset + size > payload_end:
+                        raise ValueError(f"Corrupt delta frame in {self.path}")
+                    copies.extend((start, offset, size))
+                    offset += size
+                    led += skip + count
+            offset = payload_end
+            self._times.append(ms)
+            self._ends.append(len(copies))
+
+    def frames(self, frame):
+        """
+        Decode the frames one by one
+
+        Args:
+            frame: Writable buffer of frame_size bytes; every record is
+                decoded into it, on top of the previous frame
+
+        Yields:
+            Seconds since the start of the recording at which the frame now
+            in `frame` was shown
+        """
+        view = self._view
+        times, ends, copies = self._times, self._ends, self._copies
+        start = 0
+        for index in range(len(times)):
+            end = ends[index]
+            for copy in range(start, end, 3):
+                at, offset, size = copies[copy], copies[copy + 1], copies[copy + 2]
+                frame[at:at + size] = view[offset:offset + size]
+            start = end
+            yield times[index] / 1000
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
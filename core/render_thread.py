@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Render thread.
+
+Writing a frame to WS2812 LEDs blocks for the wire time, so a mode that
+calls pixels.show() itself can't compute the next frame while the last one
+goes out. RenderThread sits in front of a NeoPixel object: the mode draws
+into a back buffer, show() hands the frame over and returns at once, and a
+background thread writes it to the LEDs. When the LEDs fall behind, only the
+newest frame is written.
+
+Inside the host this is already how modes run (the host's driver thread
+writes the strip), so start_render_thread() only adds a thread for a real or
+mock NeoPixel object.
+"""
+
+import threading
+
+
+def start_render_thread(pixels):
+    """
+    Put a render thread in front of a NeoPixel object, if it needs one
+
+    Args:
+        pixels: NeoPixel object created by the mode
+
+    Returns:
+        Object to draw into, with the NeoPixel interface
+    """
+    if getattr(pixels, "buffer", None) is not None:
+        return pixels  # The host's stand-in, already written by the driver thread
+    return RenderThread(pixels)
+
+
+def stop_render_thread(pixels):
+    """
+    Write the last handed over frame and stop the render thread, if any
+
+    Args:
+        pixels: Object returned by start_render_thread()
+    """
+    if isinstance(pixels, RenderThread):
+        pixels.close()
+
+
+class RenderThread:
+    """Double-buffered NeoPixel front end, written out on a background thread"""
+
+    def __init__(self, pixels):
+        self.pixels = pixels
+        self.n = len(pixels)
+        self.auto_write = False
+        self.frames = 0
+        self.dropped = 0
+
+        # The mode draws in the back buffer; show() copies it to the front one
+        self._back = bytearray(self.n * 3)
+        self._front = bytearray(self.n * 3)
+        self._pending = False
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.thread = threading.Thread(target=self._write_loop, name="render", daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, index, color):
+        """Set a pixel color"""
+        if index < 0:
+            index += self.n
+        if not 0 <= index < self.n:
+            raise IndexError("pixel index out of range")
+        offset = index * 3
+        self._back[offset:offset + 3] = bytes((int(color[0]), int(color[1]), int(color[2])))
+
+    def __getitem__(self, index):
+        """Get a pixel color"""
+        offset = index * 3
+        return tuple(self._back[offset:offset + 3])
+
+    def fill(self, color):
+        """Fill all pixels with the same color"""
+        self._back[:] = bytes((int(color[0]), int(color[1]), int(color[2]))) * self.n
+
+    @property
+    def buffer(self):
+        """Writable view of the frame being drawn, 3 bytes per LED"""
+        return memoryview(self._back)
+
+    def show(self):
+        """Hand the frame to the render thread, without waiting for the LEDs"""
+        with self._cond:
+            if self._pending:
+                self.dropped += 1  # The previous frame never made it out
+            self._front[:] = self._back
+            self._pending = True
+            self._cond.notify()
+
+    def close(self):
+        """Stop the render thread once the last frame is written"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.thread.join()
+
+    def _write_loop(self):
+        """Render thread: write every handed over frame to the LEDs"""
+        frame = bytearray(self.n * 3)
+        pixels = self.pixels
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                frame[:] = self._front
+                self._pending = False
+
+            # The slow part runs outside the lock, while the mode draws on
+            channels = iter(frame)
+            for index, color in enumerate(zip(channels, channels, channels)):
+                pixels[index] = color
+            pixels.show()
+            self.frames += 1
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Shared-memory framebuffer.
+
+An anonymous shared mmap holding a small header and two frame slots. Mode
+processes forked by the host draw straight into the back slot (zero-copy)
+and commit() publishes it; the driver reads the front slot whenever the
+sequence counter moves.
+
+Layout:
+    0   4s  magic (b"LEDF")
+    4   H   LED count
+    6   B   front slot (0 or 1)
+    7   x   padding
+    8   I   sequence counter, bumped on every commit
+    12  I   microseconds the writer spent computing the last committed frame
+    16  ... two slots of LED count * 3 bytes (RGB)
+"""
+
+import mmap
+import os
+import select
+import struct
+
+MAGIC = b"LEDF"
+HEADER = struct.Struct("<4sHBxII")
+_FRONT = struct.Struct("<B")
+_SEQ = struct.Struct("<I")
+_RENDER = struct.Struct("<I")
+_FRONT_OFFSET = 6
+_SEQ_OFFSET = 8
+_RENDER_OFFSET = 12
+
+
+class SharedFramebuffer:
+    """Double-slot RGB framebuffer shared between forked processes"""
+
+    def __init__(self, led_count):
+        """
+        Create the framebuffer. Must happen before forking the mode processes.
+
+        Args:
+            led_count: Number of LEDs in a frame
+        """
+        self.n = led_count
+        self.frame_size = led_count * 3
+        self._mmap = mmap.mmap(-1, HEADER.size + 2 * self.frame_size)
+        HEADER.pack_into(self._mmap, 0, MAGIC, led_count, 0, 0, 0)
+
+        view = memoryview(self._mmap)
+        start = HEADER.size
+        self._slots = (
+            view[start:start + self.frame_size],
+            view[start + self.frame_size:start + 2 * self.frame_size],
+        )
+        self._back = 1
+
+        # Wakes the reader on commit; inherited by forked writers
+        self._notify_r, self._notify_w = os.pipe()
+        os.set_blocking(self._notify_w, False)
+
+    @property
+    def seq(self):
+        return _SEQ.unpack_from(self._mmap, _SEQ_OFFSET)[0]
+
+    @property
+    def render_time(self):
+        """Seconds the writer spent computing the last committed frame"""
+        return _RENDER.unpack_from(self._mmap, _RENDER_OFFSET)[0] / 1e6
+
+    # Writer side
+
+    @property
+    def pixels(self):
+        """Writable view of the back slot, 3 bytes per LED"""
+        return self._slots[self._back]
+
+    def attach_writer(self):
+        """Take over as the writer, continuing from the frame currently shown"""
+        front = _FRONT.unpack_from(self._mmap, _FRONT_OFFSET)[0]
+        self._back = 1 - front
+        self._slots[self._back][:] = self._slots[front]
+
+    def commit(self, render_time=None):
+        """
+        Publish the back slot as the new front frame
+
+        Args:
+            render_time: Optional seconds spent computing the frame, for metrics
+        """
+        back = self._back
+        if render_time is not None:
+            us = min(0xFFFFFFFF, max(0, int(render_time * 1e6)))
+            _RENDER.pack_into(self._mmap, _RENDER_OFFSET, us)
+        _FRONT.pack_into(self._mmap, _FRONT_OFFSET, back)
+        _SEQ.pack_into(self._mmap, _SEQ_OFFSET, (self.seq + 1) & 0xFFFFFFFF)
+
+        # Keep drawing on top of what was just published
+        self._back = 1 - back
+        self._slots[self._back][:] = self._slots[back]
+        self.notify()
+
+    def notify(self):
+        """Wake the reader"""
+        try:
+            os.write(self._notify_w, b"\0")
+        except BlockingIOError:
+            pass  # Reader is already behind; one pending wake-up is enough
+
+    # Reader side
+
+    def wait(self, timeout):
+        """
+        Block until a writer commits or timeout seconds pass
+
+        Returns:
+            True if woken up by a commit or notify()
+        """
+        readable, _, _ = select.select([self._notify_r], [], [], timeout)
+        if readable:
+            os.read(self._notify_r, 4096)
+            return True
+        return False
+
+    def read(self, out, last_seq=None):
+        """
+        Copy the front frame into out if it changed
+
+        Args:
+            out: Writable buffer of frame_size bytes
+            last_seq: Sequence number of the frame the caller already has
+
+        Returns:
+            Sequence number of the copied frame, or None if unchanged
+        """
+        while True:
+            seq = self.seq
+            if seq == last_seq:
+                return None
+            front = _FRONT.unpack_from(self._mmap, _FRONT_OFFSET)[0]
+            out[:] = self._slots[front]
+            # A commit during the copy may have recycled the slot; retry
+            if self.seq == seq:
+                return seq
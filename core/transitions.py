@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Mode transitions.
+
+When the host switches modes, the last frame of the outgoing mode stays on
+the LEDs until the incoming mode shows its first frame. From there a
+transition blends the two over a short time: the outgoing frame is frozen,
+and the incoming mode keeps running underneath.
+
+    fade    crossfade the whole picture
+    wipe    the incoming mode slides in from the left, with a soft edge
+
+The weight of the incoming frame for every pixel and every step is computed
+once, at TRANSITION_FPS, when the transition is configured, so a step is one
+subtract, multiply and add over the frame.
+
+Requires numpy; the host only imports this module when a transition is
+configured.
+"""
+
+import time
+
+import numpy as np
+
+TRANSITIONS = ("fade", "wipe")
+
+TRANSITION_FPS = 60  # Steps per second
+WIPE_EDGE = 2.0  # Width of the wipe's soft edge, in pixels
+
+
+class Transition:
+    """Precomputed blend from the outgoing to the incoming mode"""
+
+    def __init__(self, kind="fade", duration=0.5, width=8, height=8, fps=TRANSITION_FPS):
+        """
+        Precompute the transition
+
+        Args:
+            kind: One of TRANSITIONS
+            duration: Seconds the transition takes
+            width: Number of LEDs horizontally
+            height: Number of LEDs vertically
+            fps: Steps per second
+        """
+        if kind not in TRANSITIONS:
+            raise ValueError(f"Unknown transition: {kind} (use one of {', '.join(TRANSITIONS)})")
+        if duration <= 0:
+            raise ValueError("Transition duration must be positive")
+
+        self.kind = kind
+        self.duration = duration
+        self.period = 1.0 / fps
+        steps = max(1, int(round(duration * fps)))
+        # Progress at the end of every step, so the last step is fully incoming
+        progress = np.arange(1, steps + 1, dtype=np.float32) / steps
+
+        if kind == "fade":
+            weights = np.repeat(progress, width * height).reshape(steps, -1)
+        else:
+            x = np.tile(np.arange(width, dtype=np.float32), height)
+            front = progress[:, None] * (width + WIPE_EDGE)
+            weights = np.clip((front - x) / WIPE_EDGE, 0, 1)
+        self.weights = weights.reshape(steps, -1, 1).astype(np.float32)
+
+        self.started = None
+        self.outgoing_seq = None
+        self._outgoing = None
+        self._work = np.empty((width * height, 3), np.float32)
+        self._output = bytearray(width * height * 3)
+        self._out = np.frombuffer(self._output, np.uint8).reshape(-1, 3)
+
+    def begin(self, outgoing, seq=None):
+        """
+        Prepare to blend away from a frame
+
+        Args:
+            outgoing: Flat RGB bytes of the outgoing mode's last frame
+            seq: Framebuffer sequence number of that frame; only a later
+                commit is the incoming mode's first frame
+        """
+        self._outgoing = np.frombuffer(bytes(outgoing), np.uint8).reshape(-1, 3).astype(np.float32)
+        self.outgoing_seq = seq
+        self.started = None
+
+    def start(self, now=None):
+        """Start blending, at the incoming mode's first frame"""
+        self.started = time.monotonic() if now is None else now
+
+    def done(self, now):
+        return self.started is not None and now - self.started >= self.duration
+
+    def blend(self, incoming, now):
+        """
+        The frame to show at a moment of the transition
+
+        Args:
+            incoming: Flat RGB bytes of the incoming mode's latest frame
+            now: time.monotonic()
+
+        Returns:
+            Flat RGB bytes; incoming itself once the transition is done
+        """
+        if self.started is None:
+            self._out[:] = self._outgoing
+            return self._output
+        step = int((now - self.started) / self.period)
+        if step >= len(self.weights):
+            return incoming
+
+        work = self._work
+        outgoing = self._outgoing
+        np.subtract(np.frombuffer(incoming, np.uint8).reshape(-1, 3), outgoing, out=work)
+        work *= self.weights[step]
+        work += outgoing
+        np.rint(work, out=work)
+        self._out[:] = work
+        return self._output
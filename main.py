@@ -2,14 +2,27 @@
 
 __version__ = "1.3.1"
 
+import argparse
 import json
 import os
-import time
-import subprocess
+import threading
+
+from core.color import DEFAULT_GAMMA
+from core.config_watch import ConfigWatcher
+from core.control import ControlServer
+from core.geometry import Geometry
+from core.host import ModeHost, Strip
+from core.metrics import TextfileExporter
+from core.playlist import Playlist
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_PATH = os.path.join(BASE_DIR, "config.json")
 MODES_DIR = os.path.join(BASE_DIR, "modes")
+CONTROL_SOCKET = os.path.join(BASE_DIR, "ledmatrix.sock")
+PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+RECORDINGS_DIR = os.path.join(BASE_DIR, "recordings")
+
+RESTART_DELAY = 1  # Seconds to wait before restarting a mode that exited
 
 # Mode name redirects for backward compatibility
 MODE_REDIRECTS = {
@@ -22,41 +35,335 @@ def load_config():
             return json.load(f)
     return {}
 
-def main():
-    while True:
-        config = load_config()
+def list_modes():
+    """Names of the installed modes: the directories in modes/ with a main.py"""
+    return sorted(
+        item for item in os.listdir(MODES_DIR)
+        if os.path.exists(os.path.join(MODES_DIR, item, "main.py"))
+    )
+
+def mode_script(mode):
+    """
+    Path of a mode's main.py
+
+    Only the installed modes are accepted, so a name from the control socket
+    can never point at a script outside modes/.
+
+    Returns:
+        The path, or None if there is no such mode
+    """
+    if not mode or "/" in mode or ".." in mode or mode not in list_modes():
+        return None
+    return os.path.join(MODES_DIR, mode, "main.py")
+
+def resolve_mode(mode):
+    """Handle mode name redirects for backward compatibility"""
+    if mode in MODE_REDIRECTS:
+        old_mode = mode
+        mode = MODE_REDIRECTS[mode]
+        print(f"Mode '{old_mode}' has been renamed to '{mode}', redirecting...")
+    return mode
+
+class Supervisor:
+    """Keeps the selected mode running and applies config changes live"""
+
+    def __init__(self, strip, isolation="thread", profile=None):
+        self.strip = strip
+        self.host = ModeHost(
+            strip, CONFIG_PATH, on_exit=self._on_mode_exit, isolation=isolation,
+            profile=profile, profile_dir=PROFILE_DIR,
+        )
+        self.config = {}
+        self.mode = None
+        self.playlist = None
+        self._playlist_started = None
+        self._upcoming = None
+        self.wake = threading.Event()
+
+    def apply_config(self):
+        """
+        Reload config.json and apply the settings that changed.
+
+        Only changed keys are applied, so a brightness or mode set through
+        the control socket sticks until the same key is edited in the file.
+        """
+        try:
+            config = load_config()
+        except ValueError as e:
+            print(f"Ignoring invalid config.json: {e}")
+            return
+
+        previous, self.config = self.config, config
+
+        brightness = config.get("brightness", 0.2)
+        if brightness != previous.get("brightness", 0.2) or not previous:
+            try:
+                self.strip.brightness = brightness
+            except (TypeError, ValueError) as e:
+                print(f"Ignoring invalid brightness: {e}")
+
+        gamma = config.get("gamma", DEFAULT_GAMMA)
+        if gamma != previous.get("gamma", DEFAULT_GAMMA) or not previous:
+            try:
+                self.strip.gamma = gamma
+            except (TypeError, ValueError) as e:
+                print(f"Ignoring invalid gamma: {e}")
+
+        transition = config.get("transition")
+        if transition != previous.get("transition") or not previous:
+            try:
+                if isinstance(transition, str):
+                    transition = {"type": transition}
+                transition = transition or {}
+                self.host.set_transition(transition.get("type"), transition.get("duration", 0.5))
+            except (AttributeError, TypeError, ValueError) as e:
+                print(f"Ignoring invalid transition: {e}")
+
+        playlist = config.get("playlist")
+        if playlist != previous.get("playlist") or not previous:
+            try:
+                self.playlist = Playlist.from_config(playlist) if playlist else None
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Ignoring invalid playlist: {e}")
+                self.playlist = None
+            self.wake.set()
+
         mode = config.get("selected_mode")
+        if mode != previous.get("selected_mode") or not previous:
+            # While a playlist entry is running, the playlist decides
+            if not (self.playlist and self.playlist.current):
+                self.select_mode(mode)
+
+    def select_mode(self, mode):
+        """Switch to another mode (picked up by the supervisor loop)"""
+        mode = resolve_mode(mode)
+        if mode != self.mode:
+            self.mode = mode
+            self.wake.set()
+
+    def handle_command(self, command, args):
+        """Dispatch a command received on the control socket"""
+        if command == "mode":
+            mode = resolve_mode(args)
+            if not mode_script(mode):
+                return {"ok": False, "error": f"No script found for mode: {mode}"}
+            self.select_mode(mode)
+        elif command == "preload":
+            mode = resolve_mode(args)
+            script_path = mode_script(mode)
+            if not script_path:
+                return {"ok": False, "error": f"No script found for mode: {mode}"}
+            self.host.preload(script_path)
+        elif command == "brightness":
+            self.strip.brightness = float(args)
+        elif command == "pause":
+            self.host.pause()
+        elif command == "resume":
+            self.host.resume()
+        elif command == "blank":
+            self.host.blank()
+        elif command == "unblank":
+            self.host.unblank()
+        elif command == "record":
+            if args == "stop":
+                self.host.stop_recording()
+            elif not args or args != os.path.basename(args) or args.startswith("."):
+                # Never a path: the service runs as root
+                return {"ok": False, "error": f"Not a plain file name: {args}"}
+            else:
+                self.host.start_recording(os.path.join(RECORDINGS_DIR, args))
+        elif command == "layer":
+            self._set_layer(args)
+        elif command == "metrics":
+            return {"ok": True, "metrics": self.host.metrics.snapshot()}
+        elif command != "status":
+            return {"ok": False, "error": f"Unknown command: {command}"}
+        return self.status()
+
+    def _set_layer(self, args):
+        """
+        Handle `layer <name> <json>` and `layer clear [name]`
+
+        The JSON holds the pixels as "data" in the ntfy-sh message format,
+        plus optional "color", "alpha", "blend" and "duration". For the
+        layer named "mode" only "alpha" is used, to dim the mode below.
+        """
+        name, _, payload = args.partition(" ")
+        if name == "clear":
+            self.host.remove_layer(payload.strip() or None)
+            return
+
+        options = json.loads(payload) if payload.strip() else {}
+        if name == "mode":
+            self.host.set_mode_alpha(options.get("alpha", 1.0))
+            return
+
+        from core.compositor import pixels_from_data  # Needs numpy
 
+        pixels = pixels_from_data(
+            options.get("data"), self.strip.n, options.get("color", (255, 255, 255))
+        )
+        self.host.set_layer(
+            name,
+            pixels,
+            alpha=options.get("alpha", 1.0),
+            blend=options.get("blend", "normal"),
+            duration=options.get("duration"),
+        )
+
+    def status(self):
+        current = self.host.current
+        stats = self.host.metrics.modes.get(current)
+        fps = stats.fps if stats else None
+        return {
+            "ok": True,
+            "version": __version__,
+            "mode": current,
+            "fps": None if fps is None else round(fps, 2),
+            "selected_mode": self.mode,
+            "brightness": self.strip.brightness,
+            "gamma": self.strip.gamma,
+            "paused": self.host.paused,
+            "blanked": self.host.blanked,
+            "recording": self.host.recorder.path if self.host.recorder else None,
+            "recording_error": self.host.recording_error,
+            "layers": self.host.layers,
+            "next_switch_in": self._next_deadline(),
+        }
+
+    def _on_mode_exit(self, mode):
+        self.wake.set()
+
+    def _update_playlist(self):
+        """Switch to the next playlist entry once its deadline has passed"""
+        playlist = self.playlist
+        if playlist is None:
+            if self._playlist_started is not None:
+                # Playlist was removed: back to the selected mode
+                self._playlist_started = None
+                self.select_mode(self.config.get("selected_mode"))
+            return
+
+        if playlist is self._playlist_started and not playlist.due():
+            return
+
+        self._playlist_started = playlist
+        entry = playlist.advance()
+        # Outside every entry's time window the selected mode runs
+        self.select_mode(entry.mode if entry else self.config.get("selected_mode"))
+
+        upcoming = playlist.upcoming()
+        if upcoming and upcoming.mode != self.mode:
+            self._upcoming = upcoming.mode
+
+    def _preload_upcoming(self):
+        """Get the next playlist mode ready while the current one is running"""
+        mode, self._upcoming = self._upcoming, None
         if not mode:
-            print("No mode selected. Waiting...")
-            time.sleep(5)
-            continue
+            return
+        script_path = mode_script(resolve_mode(mode))
+        if not script_path:
+            return
+        try:
+            self.host.preload(script_path)
+        except Exception as e:
+            print(f"Could not preload mode {mode}: {e}")
+
+    def _next_deadline(self):
+        """Seconds until the supervisor loop must wake up by itself, or None"""
+        if self.playlist is None:
+            return None
+        return self.playlist.time_until_next()
+
+    def _start(self, mode):
+        """
+        Start a mode in the host
 
-        # Handle mode name redirects for backward compatibility
-        if mode in MODE_REDIRECTS:
-            old_mode = mode
-            mode = MODE_REDIRECTS[mode]
-            print(f"Mode '{old_mode}' has been renamed to '{mode}', redirecting...")
+        Returns:
+            True if the mode was started
+        """
+        if not mode:
+            print("No mode selected. Waiting...")
+            return False
 
-        script_path = os.path.join(MODES_DIR, mode, "main.py")
+        script_path = mode_script(mode)
 
-        if not os.path.exists(script_path):
+        if not script_path:
             print(f"No script found for mode: {mode}")
-            time.sleep(5)
-            continue
+            return False
 
         print(f"Running mode: {mode} (LED Matrix v{__version__})")
+        self.host.start(mode, script_path)
+        return True
 
-        env = os.environ.copy()
-        env["LEDMATRIX_CONFIG"] = CONFIG_PATH
+    def run(self):
+        """Supervise the modes until interrupted (blocking)"""
+        started = None
+        while True:
+            self.wake.clear()
+            self._update_playlist()
+            mode = self.mode
 
-        subprocess.run(
-            [os.path.join(BASE_DIR, "ledmatrix", "bin", "python3"), script_path],
-            env=env
-        )
+            if self.host.current != mode:
+                if mode and mode == started:
+                    print(f"Mode exited. Restarting in {RESTART_DELAY} seconds...")
+                    if self.wake.wait(RESTART_DELAY):
+                        continue
+                if self._start(mode):
+                    started = mode
+                else:
+                    started = None
+                    self.host.stop()
+                    self.strip.clear()
+
+            self._preload_upcoming()
+            self.wake.wait(self._next_deadline())
+
+    def stop(self):
+        self.host.close()
+        self.strip.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LED matrix service")
+    parser.add_argument("--profile", type=float, metavar="SECONDS",
+                        help="Profile every mode for its first SECONDS and write the "
+                             "collapsed stacks to profiles/")
+    args = parser.parse_args()
+
+    config = load_config()
+    geometry = Geometry.from_config(config)
+    strip = Strip(geometry.led_count, brightness=config.get("brightness", 0.2), geometry=geometry)
+    supervisor = Supervisor(
+        strip, isolation=config.get("mode_isolation", "thread"), profile=args.profile
+    )
+    supervisor.apply_config()
+
+    watcher = ConfigWatcher(CONFIG_PATH, supervisor.apply_config)
+    watcher.start()
+    print(f"Watching {CONFIG_PATH} for changes ({watcher.backend})")
+
+    control = ControlServer(
+        config.get("control_socket", CONTROL_SOCKET), supervisor.handle_command,
+        group=config.get("control_group"),
+    )
+    control.start()
+    print(f"Listening for commands on {control.path}")
+
+    exporter = None
+    if config.get("metrics_textfile"):
+        exporter = TextfileExporter(supervisor.host.metrics, config["metrics_textfile"])
+        exporter.start()
+        print(f"Writing metrics to {exporter.path}")
 
-        print("Script exited. Restarting in 5 seconds...")
-        time.sleep(5)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        if exporter:
+            exporter.stop()
+        control.stop()
+        watcher.stop()
+        supervisor.stop()
 
 if __name__ == "__main__":
     main()
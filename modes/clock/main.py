@@ -1,21 +1,41 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import json
 import board
 import neopixel
-import time
 from datetime import datetime, timedelta
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from core.color import dim
+from core.frame_clock import FrameClock
+from core.framebuffer import Framebuffer
+from core.geometry import Geometry
+
 CONFIG_PATH = os.environ.get("LEDMATRIX_CONFIG", "config.json")
 with open(CONFIG_PATH) as f:
     config = json.load(f)
 
-LED_COUNT = 64
+geometry = Geometry.from_config(config)
+WIDTH, HEIGHT = geometry.width, geometry.height
+LED_COUNT = geometry.led_count
 PIN = board.D18
 BRIGHTNESS = config.get("brightness", 0.2)
 
 pixels = neopixel.NeoPixel(PIN, LED_COUNT, brightness=BRIGHTNESS, auto_write=False)
+fb = Framebuffer(pixels, WIDTH, HEIGHT)
+
+# The clock face is laid out on 8x8; larger matrices show it scaled up and centered
+FACE_SIZE = 8
+if min(WIDTH, HEIGHT) < FACE_SIZE:
+    raise ValueError("The clock needs a matrix of at least 8x8")
+FACE_SCALE = min(WIDTH, HEIGHT) // FACE_SIZE
+FACE_X = (WIDTH - FACE_SIZE * FACE_SCALE) // 2
+FACE_Y = (HEIGHT - FACE_SIZE * FACE_SCALE) // 2
 
 # Pomodoro timer configuration
 # Timer starts at fixed times: :00 and :30 of each hour
@@ -26,7 +46,7 @@ pixels = neopixel.NeoPixel(PIN, LED_COUNT, brightness=BRIGHTNESS, auto_write=Fal
 POMODORO_WORK_MINUTES = 25
 POMODORO_BREAK_MINUTES = 5
 
-# Matrix is 8x8, divided into 4 quadrants of 4x4 each
+# The face is 8x8, divided into 4 quadrants of 4x4 each
 # Top-left: hours (0-3, 0-3)
 # Top-right: minutes (4-7, 0-3)
 # Bottom-left: seconds (0-3, 4-7)
@@ -98,6 +118,16 @@ def xy_to_led_index(x, y):
     """
     return y * 8 + x
 
+def set_face_led(idx, color):
+    """
+    Light one LED of the 8x8 clock face, as a block of pixels on larger matrices.
+    """
+    x = FACE_X + (idx % FACE_SIZE) * FACE_SCALE
+    y = FACE_Y + (idx // FACE_SIZE) * FACE_SCALE
+    for dy in range(FACE_SCALE):
+        for dx in range(FACE_SCALE):
+            fb.set_xy(x + dx, y + dy, color)
+
 def map_to_12(value, max_value):
     """
     Map a value (0 to max_value) to 12 positions (0.0-12.0).
@@ -168,7 +198,7 @@ def render_clock():
     pomodoro_pos, is_work_session = get_pomodoro_progress()
 
     # Clear all pixels
-    pixels.fill((0, 0, 0))
+    fb.clear()
 
     # Get outer ring positions for each quadrant
     hour_ring = get_outer_ring_positions(0)     # Top-left
@@ -203,11 +233,11 @@ def render_clock():
                     # Trail LED - exponential falloff
                     brightness = 1.0 - ((distance - 1.0) / trail_length) ** 2
 
-                trailed_color = tuple(int(c * max(brightness, 0.1)) for c in color)
-                pixels[led_idx] = trailed_color
+                trailed_color = dim(color, max(brightness, 0.1))
+                set_face_led(led_idx, trailed_color)
             else:
                 # Outside trail range - very dim
-                pixels[led_idx] = tuple(int(c * 0.1) for c in color)
+                set_face_led(led_idx, dim(color, 0.1))
 
     # Helper function to fill ring with discrete LEDs and trailing effect
     def fill_ring_discrete(ring, progress, color, trail_length=5):
@@ -228,15 +258,15 @@ def render_clock():
 
             if i == current_led - 1:
                 # Current LED - fully bright
-                pixels[led_idx] = color
+                set_face_led(led_idx, color)
             elif distance < trail_length:
                 # Within trail range - exponential falloff
                 brightness = 1.0 - (distance / trail_length) ** 2
-                trailed_color = tuple(int(c * max(brightness, 0.1)) for c in color)
-                pixels[led_idx] = trailed_color
+                trailed_color = dim(color, max(brightness, 0.1))
+                set_face_led(led_idx, trailed_color)
             else:
                 # Outside trail range - very dim
-                pixels[led_idx] = tuple(int(c * 0.1) for c in color)
+                set_face_led(led_idx, dim(color, 0.1))
 
     # Use one color for all quadrants: white for work, purple for break
     base_color = (255, 255, 255) if is_work_session else (128, 0, 255)
@@ -247,12 +277,15 @@ def render_clock():
     fill_ring_smooth(second_ring, second_pos, base_color)
     fill_ring_smooth(pomodoro_ring, pomodoro_pos, base_color)
 
-    pixels.show()
+    # Only touches the LEDs when the picture actually changed
+    fb.present()
+
+frame_clock = FrameClock(10)  # Update 10 times per second
 
 try:
     while True:
         render_clock()
-        time.sleep(0.1)  # Update 10 times per second
+        frame_clock.tick()
 except KeyboardInterrupt:
     pixels.fill((0, 0, 0))
     pixels.show()
@@ -1,20 +1,32 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import json
 import board
 import neopixel
-import time
 import random
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from core.frame_clock import FrameClock
+from core.geometry import Geometry
+from core.np_framebuffer import Canvas, NumpyFramebuffer
 
 CONFIG_PATH = os.environ.get("LEDMATRIX_CONFIG", "config.json")
 with open(CONFIG_PATH) as f:
     config = json.load(f)
 
-LED_COUNT = 64
+geometry = Geometry.from_config(config)
+WIDTH, HEIGHT = geometry.width, geometry.height
+LED_COUNT = geometry.led_count
 PIN = board.D18
 BRIGHTNESS = config.get("brightness", 0.2)
 pixels = neopixel.NeoPixel(PIN, LED_COUNT, brightness=BRIGHTNESS, auto_write=False)
+fb = NumpyFramebuffer(pixels, WIDTH, HEIGHT)
 
 # 16 vibrant colors for particles
 COLORS = [
@@ -48,10 +60,6 @@ DIRECTIONS = {
 }
 
 
-def xy_to_index(x, y):
-    return y * 8 + x
-
-
 def mix_colors(color1, color2):
     """Mix two colors by averaging their RGB values."""
     return (
@@ -77,7 +85,7 @@ class Particle:
             self.trail.append((self.x, self.y))
 
     def is_out_of_bounds(self):
-        return self.x < 0 or self.x > 7 or self.y < 0 or self.y > 7
+        return self.x < 0 or self.x >= WIDTH or self.y < 0 or self.y >= HEIGHT
 
     def position(self):
         return (self.x, self.y)
@@ -89,20 +97,20 @@ def spawn_particle():
     color = random.choice(COLORS)
 
     if direction == 'right':
-        x, y = 0, random.randint(0, 7)
+        x, y = 0, random.randint(0, HEIGHT - 1)
     elif direction == 'left':
-        x, y = 7, random.randint(0, 7)
+        x, y = WIDTH - 1, random.randint(0, HEIGHT - 1)
     elif direction == 'down':
-        x, y = random.randint(0, 7), 0
+        x, y = random.randint(0, WIDTH - 1), 0
     elif direction == 'up':
-        x, y = random.randint(0, 7), 7
+        x, y = random.randint(0, WIDTH - 1), HEIGHT - 1
 
     return Particle(x, y, direction, color)
 
 
 # State
 particles = []
-trails = {}  # {(x, y): color} - color trails that fade over time
+trails = Canvas(WIDTH, HEIGHT)  # color trails that fade over time, black = no trail
 flash_positions = set()  # positions that flash bright this frame
 FADE_AMOUNT = 3  # How much RGB values decrease per frame
 MIN_BRIGHTNESS = 10  # Trails below this total brightness disappear
@@ -130,29 +138,19 @@ def update():
         pos = p.position()
 
         # Mix with existing trail or create new
-        if pos in trails:
-            trails[pos] = mix_colors(p.color, trails[pos])
+        trail = trails.get_xy(p.x, p.y)
+        if trail != (0, 0, 0):
+            trails.set_xy(p.x, p.y, mix_colors(p.color, trail))
             flash_positions.add(pos)  # Flash on overlap
         else:
-            trails[pos] = p.color
+            trails.set_xy(p.x, p.y, p.color)
 
     # Remove out-of-bounds particles
     particles = [p for p in particles if not p.is_out_of_bounds()]
 
-    # Fade all trails
-    to_remove = []
-    for pos, color in trails.items():
-        faded = (
-            max(0, color[0] - FADE_AMOUNT),
-            max(0, color[1] - FADE_AMOUNT),
-            max(0, color[2] - FADE_AMOUNT),
-        )
-        if sum(faded) < MIN_BRIGHTNESS:
-            to_remove.append(pos)
-        else:
-            trails[pos] = faded
-    for pos in to_remove:
-        del trails[pos]
+    # Fade all trails at once
+    trails.fade(FADE_AMOUNT)
+    trails.array[trails.array.sum(axis=2, dtype=np.uint16) < MIN_BRIGHTNESS] = 0
 
     # Spawn new particles
     spawn_count = random.choices([0, 1, 2, 3], weights=[20, 40, 30, 10])[0]
@@ -170,33 +168,30 @@ def brighten(color, factor=1.5):
 
 
 def render():
-    # Clear display
-    pixels.fill((0, 0, 0))
-
     # Draw trails (permanent color paths)
-    for (x, y), color in trails.items():
-        if 0 <= x <= 7 and 0 <= y <= 7:
-            idx = xy_to_index(x, y)
-            # Flash bright where particles crossed
-            if (x, y) in flash_positions:
-                pixels[idx] = brighten(color, 2.0)
-            else:
-                pixels[idx] = color
+    fb.blit(trails)
+
+    # Flash bright where particles crossed
+    for x, y in flash_positions:
+        color = trails.get_xy(x, y)
+        if color != (0, 0, 0):
+            fb.set_xy(x, y, brighten(color, 2.0))
 
     # Draw active particles (brightest)
     for p in particles:
-        if 0 <= p.x <= 7 and 0 <= p.y <= 7:
-            idx = xy_to_index(p.x, p.y)
-            pixels[idx] = brighten(p.color, 1.5)
+        if 0 <= p.x < WIDTH and 0 <= p.y < HEIGHT:
+            fb.set_xy(p.x, p.y, brighten(p.color, 1.5))
+
+    fb.present()
 
-    pixels.show()
 
+frame_clock = FrameClock(period=0.15)
 
 try:
     while True:
         update()
         render()
-        time.sleep(0.15)
+        frame_clock.tick()
 except KeyboardInterrupt:
     pixels.fill((0, 0, 0))
     pixels.show()
@@ -1,41 +1,54 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import json
 import board
 import neopixel
 import random
-import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from core.frame_clock import FrameClock
+from core.geometry import Geometry
+from core.np_framebuffer import NumpyFramebuffer
 
 CONFIG_PATH = os.environ.get("LEDMATRIX_CONFIG", "config.json")
 with open(CONFIG_PATH) as f:
     config = json.load(f)
 
-LED_COUNT = 64
+geometry = Geometry.from_config(config)
+WIDTH, HEIGHT = geometry.width, geometry.height
+LED_COUNT = geometry.led_count
 PIN = board.D18
 BRIGHTNESS = config.get("brightness", 0.2)
 
 pixels = neopixel.NeoPixel(PIN, LED_COUNT, brightness=BRIGHTNESS, auto_write=False)
-squares = [[0, 255, 0] for _ in range(LED_COUNT)]
+
+# The framebuffer is the state: one RGB triple per square
+squares = NumpyFramebuffer(pixels, WIDTH, HEIGHT)
+squares.fill((0, 255, 0))
 
 def update_one(squares):
     idx = random.randint(0, LED_COUNT - 1)
     channel = random.randint(0, 2)
     direction = random.choice([-1, 1])
 
-    value = squares[idx][channel]
-    squares[idx][channel] = max(0, min(255, value + direction))
+    value = int(squares.flat[idx, channel])
+    squares.flat[idx, channel] = max(0, min(255, value + direction))
 
 def render(squares):
-    for i in range(LED_COUNT):
-        pixels[i] = tuple(squares[i])
-    pixels.show()
+    squares.present()
+
+frame_clock = FrameClock(64)
 
 try:
     while True:
         update_one(squares)
         render(squares)
-        time.sleep(1 / 64)
+        frame_clock.tick()
 except KeyboardInterrupt:
     pixels.fill((0, 0, 0))
     pixels.show()
@@ -1,42 +1,55 @@
 import os
+import sys
 import json
 import time
 import random
 import board
 import neopixel
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from core.framebuffer import Framebuffer
+from core.geometry import Geometry
+from core.render_thread import start_render_thread, stop_render_thread
+
 CONFIG_PATH = os.environ.get("LEDMATRIX_CONFIG", "config.json")
 with open(CONFIG_PATH) as f:
     config = json.load(f)
 
-LED_COUNT = 64
+geometry = Geometry.from_config(config)
+WIDTH, HEIGHT = geometry.width, geometry.height
+LED_COUNT = geometry.led_count
 PIN = board.D18
 BRIGHTNESS = config.get("brightness", 0.2)
 SLEEP_BETWEEN_CHANGES = 0.1
 SLEEP_BETWEEN_ALGORITHMS = 2
 
-matrix = neopixel.NeoPixel(PIN, LED_COUNT, brightness=BRIGHTNESS, auto_write=False)
+COLOR_CHANGED = (255, 255, 255)
+COLOR_IN_PLACE = (0, 255, 0)
+COLOR_MISPLACED = (255, 0, 0)
+
+pixels = neopixel.NeoPixel(PIN, LED_COUNT, brightness=BRIGHTNESS, auto_write=False)
+# Sorting continues while the previous frame is written to the LEDs
+matrix = Framebuffer(start_render_thread(pixels), WIDTH, HEIGHT)
 
 def get_matrix_index(i):
     return i
 
 def update_leds(array, changed_indices=None):
-    updated = False
     for i in range(LED_COUNT):
         idx = get_matrix_index(i)
         if changed_indices and i in changed_indices:
-            new_color = (255, 255, 255)
+            new_color = COLOR_CHANGED
         elif array[i] == i:
-            new_color = (0, 255, 0)
+            new_color = COLOR_IN_PLACE
         else:
-            new_color = (255, 0, 0)
-
-        if matrix[idx] != new_color:
-            matrix[idx] = new_color
-            updated = True
+            new_color = COLOR_MISPLACED
+        matrix.set(idx, new_color)
 
-    if updated:
-        matrix.show()
+    # Skips the hardware write when nothing changed
+    matrix.present()
 
 def shuffled_array():
     values = list(range(LED_COUNT))
@@ -450,6 +463,13 @@ algorithms = [
     # ("bogosort", bogosort)
 ]
 
-while True:
-    for name, func in algorithms:
-        run_sort(name, func)
+try:
+    while True:
+        for name, func in algorithms:
+            run_sort(name, func)
+except KeyboardInterrupt:
+    print("\nShutting down...")
+    # Through the render thread, so a frame still pending can't undo it
+    matrix.clear()
+    matrix.present()
+    stop_render_thread(matrix.pixels)
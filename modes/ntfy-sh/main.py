@@ -1,33 +1,43 @@
 import os
+import sys
 import json
 import board
 import neopixel
 import websocket
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from core.framebuffer import Framebuffer
+from core.geometry import Geometry
+
 CONFIG_PATH = os.environ.get("LEDMATRIX_CONFIG", "config.json")
 with open(CONFIG_PATH) as f:
     config = json.load(f)
 
-LED_COUNT = 64
+geometry = Geometry.from_config(config)
+WIDTH, HEIGHT = geometry.width, geometry.height
+LED_COUNT = geometry.led_count
 PIN = board.D18
 BRIGHTNESS = config.get("brightness", 0.2)
 
 pixels = neopixel.NeoPixel(PIN, LED_COUNT, brightness=BRIGHTNESS, auto_write=False)
-current = [[0, 0, 0] for _ in range(LED_COUNT)]
+
+# Holds the current picture; a message without reset draws on top of it
+squares = Framebuffer(pixels, WIDTH, HEIGHT)
 
 def render(squares):
-    for i in range(LED_COUNT):
-        pixels[i] = tuple(squares[i])
-    pixels.show()
+    squares.present()
 
 def handle_message(payload):
-    global current
     try:
         message = json.loads(payload)
         data = message.get("data")
         reset = message.get("reset", True)
         default_color = message.get("color", [0, 255, 0])
-        squares = [[0, 0, 0] for _ in range(LED_COUNT)] if reset else [c[:] for c in current]
+        if reset:
+            squares.clear()
 
         if isinstance(data, dict):
             data = [data]
@@ -40,20 +50,20 @@ def handle_message(payload):
                 if "index" in item and isinstance(item["index"], int):
                     idx = item["index"]
                     if 0 <= idx < LED_COUNT:
-                        squares[idx] = col
+                        squares.set(idx, col)
                 if "pattern" in item and isinstance(item["pattern"], list):
                     offset = item.get("offset", 0)
                     for i, bit in enumerate(item["pattern"]):
                         if bit:
                             idx = offset + i
                             if 0 <= idx < LED_COUNT:
-                                squares[idx] = col
+                                squares.set(idx, col)
 
-        current = [c[:] for c in squares]
         render(squares)
 
     except Exception:
-        pass
+        # Invalid message: keep showing the previous picture
+        squares.revert()
 
 def on_message(ws, message):
     try:
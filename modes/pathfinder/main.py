@@ -22,6 +22,10 @@ import random
 # Add current directory to path so we can import our modules
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
 try:
     import board
     import neopixel
@@ -29,6 +33,10 @@ except (ImportError, NotImplementedError):
     # Allow imports to work in visualizer environment
     pass
 
+from core.frame_clock import FrameClock
+from core.framebuffer import Framebuffer
+from core.geometry import Geometry
+from core.render_thread import start_render_thread, stop_render_thread
 from maze import Maze
 from algorithms import (
     BreadthFirstSearch,
@@ -41,22 +49,26 @@ from algorithms import (
 )
 
 
-# LED Configuration
-LED_COUNT = 64
-PIN = board.D18
-GRID_SIZE = 8
-
 # Load config
 CONFIG_PATH = os.environ.get("LEDMATRIX_CONFIG", "config.json")
 with open(CONFIG_PATH) as f:
     config = json.load(f)
 
+# LED Configuration
+geometry = Geometry.from_config(config)
+LED_COUNT = geometry.led_count
+PIN = board.D18
+GRID_WIDTH = geometry.width
+GRID_HEIGHT = geometry.height
+
 BRIGHTNESS = config.get("brightness", 0.2)
 
 # Initialize LED strip at module level (required for visualizer)
 pixels = neopixel.NeoPixel(
     PIN, LED_COUNT, brightness=BRIGHTNESS, auto_write=False
 )
+# Steps are computed while the previous frame is written to the LEDs
+fb = Framebuffer(start_render_thread(pixels), GRID_WIDTH, GRID_HEIGHT)
 
 # Colors (R, G, B) - Modern, elegant palette
 COLOR_START = (0, 200, 100)  # Teal/cyan (fresh, distinct)
@@ -75,41 +87,41 @@ PAUSE_BEFORE_START = 1.0  # Seconds to show maze before algorithm starts
 
 def coord_to_index(x: int, y: int) -> int:
     """Convert grid coordinates to LED index."""
-    return y * GRID_SIZE + x
+    return y * GRID_WIDTH + x
 
 
-def draw_maze(pixels, grid, start, goal):
+def draw_maze(fb, grid, start, goal):
     """
     Draw the initial maze state.
 
     Args:
-        pixels: NeoPixel object
+        fb: Framebuffer to draw into
         grid: 2D list where True = obstacle
         start: (x, y) tuple for start position
         goal: (x, y) tuple for goal position
     """
-    for y in range(GRID_SIZE):
-        for x in range(GRID_SIZE):
+    for y in range(GRID_HEIGHT):
+        for x in range(GRID_WIDTH):
             idx = coord_to_index(x, y)
 
             if (x, y) == start:
-                pixels[idx] = COLOR_START
+                fb.set(idx, COLOR_START)
             elif (x, y) == goal:
-                pixels[idx] = COLOR_GOAL
+                fb.set(idx, COLOR_GOAL)
             elif grid[y][x]:  # Obstacle
-                pixels[idx] = COLOR_OBSTACLE
+                fb.set(idx, COLOR_OBSTACLE)
             else:
-                pixels[idx] = COLOR_EMPTY
+                fb.set(idx, COLOR_EMPTY)
 
-    pixels.show()
+    fb.present()
 
 
-def run_algorithm(pixels, algorithm_class, algorithm_name, maze, start, goal):
+def run_algorithm(fb, algorithm_class, algorithm_name, maze, start, goal):
     """
     Run a pathfinding algorithm and visualize it.
 
     Args:
-        pixels: NeoPixel object
+        fb: Framebuffer to draw into
         algorithm_class: Class of the algorithm to run
         algorithm_name: Name for display/debugging
         maze: Maze object
@@ -118,6 +130,7 @@ def run_algorithm(pixels, algorithm_class, algorithm_name, maze, start, goal):
     """
     # Initialize algorithm
     algorithm = algorithm_class(maze, start, goal)
+    frame_clock = FrameClock(period=STEP_DELAY)
 
     # Track explored nodes for visualization
     explored = set()
@@ -129,28 +142,28 @@ def run_algorithm(pixels, algorithm_class, algorithm_name, maze, start, goal):
 
         if step.step_type == STEP_FRONTIER:
             frontier.add((step.x, step.y))
-            pixels[idx] = COLOR_FRONTIER
+            fb.set(idx, COLOR_FRONTIER)
 
         elif step.step_type == STEP_EXPLORE:
             explored.add((step.x, step.y))
             if (step.x, step.y) in frontier:
                 frontier.remove((step.x, step.y))
-            pixels[idx] = COLOR_EXPLORED
+            fb.set(idx, COLOR_EXPLORED)
 
         elif step.step_type == STEP_PATH:
-            pixels[idx] = COLOR_PATH
+            fb.set(idx, COLOR_PATH)
 
         # Keep start and goal visible
-        pixels[coord_to_index(*start)] = COLOR_START
-        pixels[coord_to_index(*goal)] = COLOR_GOAL
+        fb.set(coord_to_index(*start), COLOR_START)
+        fb.set(coord_to_index(*goal), COLOR_GOAL)
 
-        pixels.show()
-        time.sleep(STEP_DELAY)
+        fb.present()
+        frame_clock.tick()
 
 
 def main():
     """Main loop."""
-    global pixels  # Use the module-level pixels instance
+    global fb  # Use the module-level framebuffer
 
     # Algorithm sequence - cycles through all algorithms in order
     algorithms = [
@@ -164,25 +177,27 @@ def main():
         while True:
             # Generate ONE new maze for all algorithms to compare
             obstacle_density = random.uniform(0.15, 0.30)
-            maze = Maze(width=GRID_SIZE, height=GRID_SIZE, obstacle_density=obstacle_density)
+            maze = Maze(width=GRID_WIDTH, height=GRID_HEIGHT, obstacle_density=obstacle_density)
             grid, start, goal = maze.generate()
 
             # Run ALL algorithms on the SAME maze
             for algorithm_class, algorithm_name in algorithms:
                 # Draw initial maze
-                draw_maze(pixels, grid, start, goal)
+                draw_maze(fb, grid, start, goal)
                 time.sleep(PAUSE_BEFORE_START)
 
                 # Run this algorithm
-                run_algorithm(pixels, algorithm_class, algorithm_name, maze, start, goal)
+                run_algorithm(fb, algorithm_class, algorithm_name, maze, start, goal)
 
                 # Pause to show result
                 time.sleep(PAUSE_AFTER_PATH)
 
     except KeyboardInterrupt:
         print("\nShutting down...")
-        pixels.fill((0, 0, 0))
-        pixels.show()
+        # Through the render thread, so a frame still pending can't undo it
+        fb.clear()
+        fb.present()
+        stop_render_thread(fb.pixels)
 
 
 # Start the visualization immediately when module is imported
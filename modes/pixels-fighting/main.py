@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import json
 import board
 import neopixel
@@ -8,15 +9,25 @@ import random
 import time
 import math
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from core.framebuffer import Framebuffer
+from core.geometry import Geometry
+
 CONFIG_PATH = os.environ.get("LEDMATRIX_CONFIG", "config.json")
 with open(CONFIG_PATH) as f:
     config = json.load(f)
 
-LED_COUNT = 64
+geometry = Geometry.from_config(config)
+WIDTH, HEIGHT = geometry.width, geometry.height
+LED_COUNT = geometry.led_count
 PIN = board.D18
 BRIGHTNESS = config.get("brightness", 0.2)
 
-pixels = neopixel.NeoPixel(PIN, LED_COUNT, brightness=BRIGHTNESS)
+pixels = neopixel.NeoPixel(PIN, LED_COUNT, brightness=BRIGHTNESS, auto_write=False)
+fb = Framebuffer(pixels, WIDTH, HEIGHT)
 last_color_pair_index = -1
 
 def initialize_battlefield():
@@ -48,12 +59,12 @@ def initialize_battlefield():
     color1, color2 = contrasting_color_pairs[new_index]
 
     for i in range(LED_COUNT):
-        if i % 8 < 4:
-            pixels[i] = color1
+        if i % WIDTH < WIDTH // 2:
+            fb.set(i, color1)
         else:
-            pixels[i] = color2
+            fb.set(i, color2)
 
-    pixels.show()
+    fb.present()
     return color1, color2
 
 def colors_are_similar(color1, color2, tolerance=10):
@@ -62,7 +73,7 @@ def colors_are_similar(color1, color2, tolerance=10):
 def count_color(target_color):
     count = 0
     for i in range(LED_COUNT):
-        if colors_are_similar(pixels[i], target_color):
+        if colors_are_similar(fb.get(i), target_color):
             count += 1
     return count
 
@@ -75,9 +86,9 @@ def is_neighbor_same_color(x, y, color):
     ]
 
     for nx, ny in direct_neighbors:
-        if 0 <= nx < 8 and 0 <= ny < 8:
-            neighbor_index = ny * 8 + nx
-            if colors_are_similar(pixels[neighbor_index], color, tolerance=10):
+        if 0 <= nx < WIDTH and 0 <= ny < HEIGHT:
+            neighbor_index = ny * WIDTH + nx
+            if colors_are_similar(fb.get(neighbor_index), color, tolerance=10):
                 return True
     return False
 
@@ -86,14 +97,14 @@ def fight(color1, color2):
     exponent = random.uniform(0.1, 0.3)
 
     while fight:
-        x, y = random.randint(0, 7), random.randint(0, 7)
-        opponent_x = random.randint(0, 7)
-        opponent_index = y * 8 + opponent_x
+        x, y = random.randint(0, WIDTH - 1), random.randint(0, HEIGHT - 1)
+        opponent_x = random.randint(0, WIDTH - 1)
+        opponent_index = y * WIDTH + opponent_x
 
-        attacking_color = color1 if x < 4 else color2
-        defending_color = color2 if x < 4 else color1
+        attacking_color = color1 if x < WIDTH // 2 else color2
+        defending_color = color2 if x < WIDTH // 2 else color1
 
-        if is_neighbor_same_color(opponent_x, y, attacking_color) and not colors_are_similar(pixels[opponent_index], attacking_color):
+        if is_neighbor_same_color(opponent_x, y, attacking_color) and not colors_are_similar(fb.get(opponent_index), attacking_color):
             color1_count = count_color(color1)
             color2_count = count_color(color2)
             total_count = color1_count + color2_count
@@ -109,17 +120,19 @@ def fight(color1, color2):
             else:
                 winner_color = color2 if random.random() < chance_color2 else defending_color
 
-            pixels[opponent_index] = winner_color
+            fb.set(opponent_index, winner_color)
 
-        pixels.show()
+        fb.present()
 
         if count_color(color1) > LED_COUNT - 1:
-            pixels.fill(color1)
+            fb.fill(color1)
+            fb.present()
             fight = False
             time.sleep(1)
             break
         elif count_color(color2) > LED_COUNT - 1:
-            pixels.fill(color2)
+            fb.fill(color2)
+            fb.present()
             fight = False
             time.sleep(1)
             break
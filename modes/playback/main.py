@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import board
+import neopixel
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from core.framebuffer import Framebuffer
+from core.geometry import Geometry
+from core.recorder import Recording
+
+CONFIG_PATH = os.environ.get("LEDMATRIX_CONFIG", "config.json")
+with open(CONFIG_PATH) as f:
+    config = json.load(f)
+
+geometry = Geometry.from_config(config)
+WIDTH, HEIGHT = geometry.width, geometry.height
+LED_COUNT = geometry.led_count
+PIN = board.D18
+BRIGHTNESS = config.get("brightness", 0.2)
+
+settings = config.get("modes", {}).get("playback", {})
+RECORDING = settings.get("file")
+SPEED = settings.get("speed", 1.0)  # 2.0 plays twice as fast
+LOOP = settings.get("loop", True)
+PAUSE_BETWEEN_LOOPS = settings.get("pause", 0)  # Seconds to hold the last frame
+MIN_LOOP_TIME = 0.1  # Seconds a loop takes at least, even for a recording without duration
+
+if not RECORDING:
+    raise ValueError("No recording found in config.json (modes.playback.file)")
+if SPEED <= 0:
+    raise ValueError("Playback speed must be positive")
+
+recording = Recording(os.path.join(BASE_DIR, RECORDING))
+if recording.led_count != LED_COUNT:
+    raise ValueError(f"Recording is for {recording.led_count} LEDs, the matrix has {LED_COUNT}")
+
+pixels = neopixel.NeoPixel(PIN, LED_COUNT, brightness=BRIGHTNESS, auto_write=False)
+fb = Framebuffer(pixels, WIDTH, HEIGHT)
+
+# Every record is decoded into this one buffer, on top of the previous frame
+frame = bytearray(recording.frame_size)
+
+def play():
+    """Show every frame of the recording at its original time, scaled by SPEED"""
+    start = time.monotonic()
+    for shown_at in recording.frames(frame):
+        delay = start + shown_at / SPEED - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        fb.load(frame)
+        fb.present()
+
+    # Hold the last frame as long as it was shown while recording
+    delay = start + recording.duration / SPEED - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+try:
+    while True:
+        started = time.monotonic()
+        play()
+        if not LOOP:
+            break
+        time.sleep(max(PAUSE_BETWEEN_LOOPS, MIN_LOOP_TIME - (time.monotonic() - started)))
+    # Keep the last frame on the matrix instead of exiting (and restarting)
+    while True:
+        time.sleep(60)
+except KeyboardInterrupt:
+    pixels.fill((0, 0, 0))
+    pixels.show()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+LED Matrix Mode Benchmark
+Runs every mode headless against the mock hardware, on a virtual clock, and
+measures what a frame costs:
+
+    cpu_ms_per_frame        CPU time per frame
+    shows_per_second        show() calls per (virtual) second
+    wire_share              part of the time spent sending frames to the LEDs
+    alloc_bytes_per_frame   memory a frame allocates at its peak (tracemalloc)
+    growth_bytes_per_frame  memory still held after a frame (leaks, caches)
+
+The mock NeoPixel models WS2812 wire timing (see mock_hardware), so a
+show() takes as long as on real LEDs. A wire_share near 1 means the mode
+is limited by the LEDs rather than by the CPU. The mode's own sleeps and
+the wire time take no real time, so a run of SECONDS virtual seconds
+takes only as long as computing its frames. A mode that doesn't sleep
+between frames (pixels-fighting) is stopped after FRAMES frames instead,
+whichever comes first. Every mode runs in a fresh
+process, twice: once for the timings and once under tracemalloc (which
+slows Python down too much to time at the same time). The timing run is
+repeated and the fastest one kept, which filters out most noise from other
+processes. random is seeded, so runs are repeatable.
+
+Results are written as JSON. With --baseline, the results are compared to
+an earlier run (by default the baseline.json next to this script) and the
+exit status is 1 if a mode got slower (or allocates more) than the
+threshold allows.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VISUALIZER_DIR = os.path.dirname(os.path.abspath(__file__))
+MODES_DIR = os.path.join(BASE_DIR, "modes")
+
+DEFAULT_SECONDS = 30  # Virtual seconds per mode
+DEFAULT_FRAMES = 5000  # Frames per mode, at most
+DEFAULT_REPEAT = 3  # Timing runs per mode
+DEFAULT_THRESHOLD = 0.2  # Allowed slowdown against the baseline (20%)
+DEFAULT_BASELINE = os.path.join(VISUALIZER_DIR, "baseline.json")
+CHILD_TIMEOUT = 300  # Real seconds a mode may take before it's given up on
+
+# Modes that can't run unattended
+SKIP = {
+    "ntfy-sh": "needs a network connection and a topic",
+    "playback": "needs a recording",
+}
+
+# Results compared against the baseline, lower is better
+COMPARED = ("cpu_ms_per_frame", "alloc_bytes_per_frame")
+
+
+def measure(mode, seconds, max_frames=DEFAULT_FRAMES, trace=False):
+    """
+    Run a mode in this process and measure it (called in a child process)
+
+    Args:
+        mode: Mode name
+        seconds: Virtual seconds to run the mode for
+        max_frames: Frames to stop after, if that comes first
+        trace: Measure allocations with tracemalloc instead of timings
+
+    Returns:
+        Dict with the measurements
+    """
+    sys.path.insert(0, BASE_DIR)
+    sys.path.insert(0, VISUALIZER_DIR)
+    import mock_hardware
+    from virtual_clock import VirtualClock
+
+    sys.modules["board"] = mock_hardware
+    sys.modules["neopixel"] = mock_hardware
+    mock_hardware.MockNeoPixel.wire_timing = True
+    random.seed(0)
+
+    clock = VirtualClock(None, limit=seconds)
+    clock.install()
+
+    shows = [0]
+    alloc = []
+    growth = []
+    first = {}  # CPU time and traced memory at the first frame
+    real_show = mock_hardware.MockNeoPixel.show
+
+    def show(pixels):
+        if shows[0] > max_frames or clock.finished.is_set():
+            clock.finished.set()
+            threading.Event().wait()  # Hold the mode; the measurement is done
+        if not first:
+            # Everything before the first frame is start-up, not frame time
+            first["cpu"] = time.process_time()
+            if trace:
+                tracemalloc.start()
+                first["memory"] = tracemalloc.get_traced_memory()[0]
+        elif trace:
+            current, peak = tracemalloc.get_traced_memory()
+            alloc.append(peak - first["memory"])
+            growth.append(current - first["memory"])
+            first["memory"] = current
+            tracemalloc.reset_peak()
+
+        shows[0] += 1
+        real_show(pixels)
+
+    mock_hardware.MockNeoPixel.show = show
+    errors = []
+
+    def run():
+        clock.attach()
+        try:
+            spec = importlib.util.spec_from_file_location("led_mode", os.path.join(MODES_DIR, mode, "main.py"))
+            spec.loader.exec_module(importlib.util.module_from_spec(spec))
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while thread.is_alive() and not clock.finished.wait(0.05):
+        pass
+    cpu = time.process_time()
+
+    if errors:
+        return {"error": errors[0]}
+    frames = shows[0] - 1  # Frames after the first one
+    if frames < 1:
+        return {"error": "showed fewer than 2 frames"}
+
+    strip = mock_hardware.MockNeoPixel.get_latest_instance()
+    result = {
+        "frames": frames,
+        "virtual_seconds": clock.elapsed,
+        "cpu_ms_per_frame": (cpu - first["cpu"]) * 1000 / frames,
+        "shows_per_second": shows[0] / clock.elapsed if clock.elapsed else None,
+        "wire_share": strip.wire_total / clock.elapsed if clock.elapsed else None,
+    }
+    if trace:
+        result = {
+            "alloc_bytes_per_frame": statistics.median(alloc),
+            "growth_bytes_per_frame": sum(growth) / frames,
+        }
+    return result
+
+
+def run_child(mode, seconds, max_frames, config_path, trace=False):
+    """Measure a mode in a fresh Python process"""
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child", mode,
+        "--seconds", str(seconds), "--frames", str(max_frames),
+    ]
+    if trace:
+        command.append("--trace")
+    env = dict(os.environ, LEDMATRIX_CONFIG=config_path)
+    try:
+        output = subprocess.run(
+            command, env=env, capture_output=True, text=True, timeout=CHILD_TIMEOUT
+        ).stdout
+    except subprocess.TimeoutExpired:
+        return {"error": f"took longer than {CHILD_TIMEOUT}s"}
+    for line in reversed(output.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    return {"error": "no result"}
+
+
+def benchmark(modes, seconds, max_frames, config_path, repeat=DEFAULT_REPEAT):
+    """
+    Benchmark modes
+
+    Returns:
+        Dict with the environment and a result per mode
+    """
+    results = {}
+    for mode in modes:
+        if mode in SKIP:
+            print(f"{mode}: skipped, {SKIP[mode]}")
+            continue
+        runs = [run_child(mode, seconds, max_frames, config_path) for _ in range(repeat)]
+        timed = [run for run in runs if "error" not in run]
+        result = min(timed, key=lambda run: run["cpu_ms_per_frame"]) if timed else runs[0]
+        if "error" not in result:
+            result.update(run_child(mode, seconds, max_frames, config_path, trace=True))
+        results[mode] = result
+
+        if "error" in result:
+            print(f"{mode}: {result['error']}")
+        else:
+            print(
+                f"{mode}: {result['frames']} frames, {result['cpu_ms_per_frame']:.3f} ms CPU/frame, "
+                f"{result['wire_share'] or 0:.0%} on the wire, "
+                f"{result.get('alloc_bytes_per_frame', 0):.0f} bytes allocated/frame"
+            )
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seconds": seconds,
+        "frames": max_frames,
+        "repeat": repeat,
+        "modes": results,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results to a baseline
+
+    Returns:
+        List of regression messages, empty if none
+    """
+    regressions = []
+    for mode, result in results["modes"].items():
+        before = baseline.get("modes", {}).get(mode)
+        if not before or "error" in before or "error" in result:
+            continue
+        for key in COMPARED:
+            if key not in before or key not in result:
+                continue
+            if result[key] > before[key] * (1 + threshold):
+                regressions.append(f"{mode}: {key} {result[key]:.3f}, baseline {before[key]:.3f}")
+    return regressions
+
+
+def list_modes():
+    return sorted(
+        item for item in os.listdir(MODES_DIR)
+        if os.path.exists(os.path.join(MODES_DIR, item, "main.py"))
+    )
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="LED Matrix mode benchmark")
+    parser.add_argument("modes", nargs="*", help="Modes to benchmark (default: all)")
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS,
+                        help=f"Virtual seconds to run every mode for (default {DEFAULT_SECONDS})")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES,
+                        help=f"Frames to stop every mode after, at most (default {DEFAULT_FRAMES})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Timing runs per mode, the fastest is kept (default {DEFAULT_REPEAT})")
+    parser.add_argument("--config", help="config.json to run the modes with (default: defaults)")
+    parser.add_argument("--output", metavar="PATH", help="Write the results as JSON to a file")
+    parser.add_argument("--baseline", metavar="PATH", nargs="?", const=DEFAULT_BASELINE,
+                        help="Compare to the results of an earlier run "
+                             "(default: the committed baseline.json)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Allowed slowdown against the baseline (default {DEFAULT_THRESHOLD})")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Write the results to the baseline file instead of comparing")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--trace", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.seconds, args.frames, args.trace)))
+        return
+
+    config_path = args.config
+    if not config_path:
+        # The modes' defaults, not whatever the local config.json says
+        config_file = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+        json.dump({}, config_file)
+        config_file.close()
+        config_path = config_file.name
+
+    try:
+        results = benchmark(
+            args.modes or list_modes(), args.seconds, args.frames, os.path.abspath(config_path),
+            max(1, args.repeat)
+        )
+    finally:
+        if not args.config:
+            os.unlink(config_path)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    elif not args.baseline:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("Slower than the baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,29 @@
 #!/usr/bin/env python3
 """
 LED Matrix Visualizer GUI
-Displays a virtual 8x8 LED matrix using PyGame
+Displays a virtual LED matrix (8x8 by default) using PyGame
+
+Frames can be handed over from any thread: set_pixels() publishes an
+immutable (sequence number, frame) tuple with a single assignment, and
+draw() picks up the latest one. Brightness is applied once per drawn
+frame, not per handed over frame.
 """
 
+import itertools
 import pygame
 import sys
 import threading
 import time
 
+BACKGROUND = (20, 20, 20)
+
+# LED colors are drawn with the lowest 2 bits of every channel dropped, so
+# a fading LED reuses a handful of sprites instead of one per shade
+QUANTIZE = 0xFC
+SPRITE_CACHE_SIZE = 4096
+
 class LEDMatrixVisualizer:
-    """PyGame-based visualizer for 8x8 LED matrix"""
+    """PyGame-based visualizer for a LED matrix"""
 
     def __init__(self, width=8, height=8, led_size=60, spacing=5, title="LED Matrix Visualizer"):
         """
@@ -38,9 +51,18 @@ class LEDMatrixVisualizer:
         self.screen = pygame.display.set_mode((self.window_width, self.window_height))
         pygame.display.set_caption(title)
 
-        # LED states (RGB tuples)
+        # LED states as drawn (RGB tuples, brightness applied)
         self.pixels = [(0, 0, 0)] * self.led_count
 
+        # Latest handed over frame, replaced as a whole: (sequence number, colors)
+        self._seq = itertools.count(1)
+        self._frame = (0, (((0, 0, 0),) * self.led_count))
+        self._drawn = None  # (sequence number, brightness) of self.pixels
+
+        # Optional NeoPixel object to pull frames from, once per drawn frame
+        self.source = None
+        self._source_seq = None
+
         # Control flags
         self.running = True
         self.paused = False
@@ -56,20 +78,68 @@ class LEDMatrixVisualizer:
         self.clock = pygame.time.Clock()
         self.fps = 60
 
+        # Screen position of every LED (left to right, top to bottom)
+        self._led_rects = [
+            pygame.Rect(
+                spacing + x * (led_size + spacing), spacing + y * (led_size + spacing),
+                led_size, led_size
+            )
+            for y in range(height)
+            for x in range(width)
+        ]
+        status_y = height * (led_size + spacing) + spacing
+        self._status_rect = pygame.Rect(0, status_y, self.window_width, self.window_height - status_y)
+        self._sprites = {}  # Quantized color -> LED surface
+        self._shown = None  # Quantized color drawn per LED; None to draw everything
+        self._status = None
+
     def set_pixels(self, pixels):
-        """Update all pixel colors"""
+        """Update all pixel colors (from any thread)"""
         if len(pixels) == self.led_count:
-            self.pixels = [self._apply_brightness(p) for p in pixels]
+            self._frame = (next(self._seq), tuple(pixels))
+
+    def set_source(self, source, every_frame=False):
+        """
+        Pull frames from a NeoPixel object before every draw
+
+        Args:
+            source: Object with get_frame(since), like mock_hardware.MockNeoPixel
+            every_frame: Ignored; a window only shows the latest frame
+        """
+        self.source = source
+        self._source_seq = None
+
+    def pull(self):
+        """Take the latest frame from the source, if it showed a new one"""
+        if self.source is None or self.paused:
+            return
+        update = self.source.get_frame(self._source_seq)
+        if update is not None:
+            self._source_seq, pixels = update
+            self.set_pixels(pixels)
 
     def set_pixel(self, index, color):
         """Update a single pixel color"""
         if 0 <= index < self.led_count:
-            self.pixels[index] = self._apply_brightness(color)
+            frame = list(self._frame[1])
+            frame[index] = tuple(color)
+            self._frame = (next(self._seq), tuple(frame))
 
     def _apply_brightness(self, color):
         """Apply brightness adjustment to a color"""
         return tuple(int(c * self.brightness) for c in color)
 
+    def _take_frame(self):
+        """Bring self.pixels up to date with the latest frame and brightness"""
+        seq, frame = self._frame
+        if self._drawn == (seq, self.brightness):
+            return
+        if self.brightness >= 1.0:
+            self.pixels = list(frame)
+        else:
+            self.pixels = [self._apply_brightness(p) for p in frame]
+        self._drawn = (seq, self.brightness)
+
     def set_brightness(self, brightness):
         """Set display brightness (0.0 - 1.0)"""
         self.brightness = max(0.0, min(1.0, brightness))
@@ -79,61 +149,77 @@ class LEDMatrixVisualizer:
         self.paused = not self.paused
 
     def draw(self):
-        """Draw the LED matrix"""
-        # Clear screen with dark background
-        self.screen.fill((20, 20, 20))
-
-        # Draw each LED
-        for y in range(self.height):
-            for x in range(self.width):
-                # Convert x,y to LED index (left to right, top to bottom)
-                index = y * self.width + x
-
-                # Calculate position
-                px = self.spacing + x * (self.led_size + self.spacing)
-                py = self.spacing + y * (self.led_size + self.spacing)
-
-                # Get color
-                color = self.pixels[index] if index < len(self.pixels) else (0, 0, 0)
-
-                # Draw LED background (dark circle)
-                pygame.draw.circle(
-                    self.screen,
-                    (40, 40, 40),
-                    (px + self.led_size // 2, py + self.led_size // 2),
-                    self.led_size // 2
-                )
-
-                # Draw LED (colored circle)
-                if color != (0, 0, 0):
-                    pygame.draw.circle(
-                        self.screen,
-                        color,
-                        (px + self.led_size // 2, py + self.led_size // 2),
-                        self.led_size // 2 - 2
-                    )
-
-        # Draw status bar (if font available)
+        """Draw the LED matrix, only redrawing the LEDs that changed"""
+        self._take_frame()
+
+        rects = []
+        full = self._shown is None
+        if full:
+            # Clear screen with dark background
+            self.screen.fill(BACKGROUND)
+            self._shown = [None] * self.led_count
+            self._status = None
+
+        # Blit a pre-rendered sprite for every LED whose color changed
+        shown = self._shown
+        for index, color in enumerate(self.pixels):
+            key = (color[0] & QUANTIZE, color[1] & QUANTIZE, color[2] & QUANTIZE)
+            if shown[index] == key:
+                continue
+            shown[index] = key
+            rect = self._led_rects[index]
+            self.screen.blit(self._sprite(key), rect)
+            rects.append(rect)
+
+        # Draw status bar (if font available), when its text changed
         if self.font:
-            status_y = self.height * (self.led_size + self.spacing) + self.spacing + 10
-
-            status_text = f"FPS: {int(self.clock.get_fps())} | "
+            status_text = f"FPS: {self.clock.get_fps():.0f} | "
             status_text += f"Brightness: {int(self.brightness * 100)}% | "
             status_text += "PAUSED" if self.paused else "Running"
             status_text += " | Q:Quit SPACE:Pause +/-:Brightness"
 
-            text_surface = self.font.render(status_text, True, (200, 200, 200))
-            self.screen.blit(text_surface, (10, status_y))
+            if status_text != self._status:
+                self._status = status_text
+                self.screen.fill(BACKGROUND, self._status_rect)
+                text_surface = self.font.render(status_text, True, (200, 200, 200))
+                self.screen.blit(text_surface, (10, self._status_rect.y + 10))
+                rects.append(self._status_rect)
 
         # Update display
-        pygame.display.flip()
+        if full:
+            pygame.display.flip()
+        elif rects:
+            pygame.display.update(rects)
         self.clock.tick(self.fps)
 
+    def redraw(self):
+        """Draw everything again on the next draw(), e.g. after the window was exposed"""
+        self._shown = None
+
+    def _sprite(self, color):
+        """Pre-rendered LED of a (quantized) color"""
+        sprite = self._sprites.get(color)
+        if sprite is None:
+            if len(self._sprites) >= SPRITE_CACHE_SIZE:
+                self._sprites.clear()
+            size = self.led_size
+            sprite = pygame.Surface((size, size))
+            sprite.fill(BACKGROUND)
+            # LED background (dark circle)
+            pygame.draw.circle(sprite, (40, 40, 40), (size // 2, size // 2), size // 2)
+            # LED (colored circle)
+            if color != (0, 0, 0):
+                pygame.draw.circle(sprite, color, (size // 2, size // 2), size // 2 - 2)
+            self._sprites[color] = sprite
+        return sprite
+
     def handle_events(self):
         """Handle PyGame events"""
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.redraw()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_q:
                     self.running = False
@@ -148,6 +234,7 @@ class LEDMatrixVisualizer:
         """Main visualization loop (blocking)"""
         while self.running:
             self.handle_events()
+            self.pull()
             self.draw()
 
         pygame.quit()
@@ -158,6 +245,7 @@ class LEDMatrixVisualizer:
             return False
 
         self.handle_events()
+        self.pull()
         self.draw()
         return True
 
@@ -213,9 +301,9 @@ if __name__ == "__main__":
     frame = 0
     while viz.running:
         # Random sparkle effect
-        pixels = [(0, 0, 0)] * 64
+        pixels = [(0, 0, 0)] * viz.led_count
         for _ in range(10):
-            idx = random.randint(0, 63)
+            idx = random.randint(0, viz.led_count - 1)
             pixels[idx] = (
                 random.randint(0, 255),
                 random.randint(0, 255),
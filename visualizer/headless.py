@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Headless LED Matrix Visualizer
+Runs a mode against the mock hardware without a display, e.g. on a CI
+server or in benchmarks, collecting the shown frames instead of drawing them
+"""
+
+import time
+from collections import deque
+
+DEFAULT_CAPACITY = 1024  # Frames kept in the ring buffer
+
+
+class HeadlessVisualizer:
+    """Collects frames like LEDMatrixVisualizer, without PyGame"""
+
+    def __init__(self, width=8, height=8, fps=60, capacity=DEFAULT_CAPACITY, sink=None):
+        """
+        Initialize the headless visualizer
+
+        Args:
+            width: Number of LEDs horizontally (default 8)
+            height: Number of LEDs vertically (default 8)
+            fps: Times per second to pull a frame from the source (None to
+                poll as fast as possible, so no frame is missed)
+            capacity: Number of most recent frames to keep
+            sink: Optional callable, called as sink(timestamp, pixels) for
+                every collected frame
+        """
+        self.width = width
+        self.height = height
+        self.led_count = width * height
+        self.fps = fps
+        self.sink = sink
+        self.frames = deque(maxlen=capacity)  # (time.monotonic(), pixels)
+        self.frame_count = 0
+
+        self.running = True
+        self.paused = False
+        self.source = None
+        self._source_seq = None
+        self._every_frame = False
+
+    def set_source(self, source, every_frame=False):
+        """
+        Pull frames from a NeoPixel object
+
+        Args:
+            source: Object with get_frame(since), like mock_hardware.MockNeoPixel
+            every_frame: Collect every shown frame, from the mode's thread,
+                instead of the latest one at the pull rate
+        """
+        self.source = source
+        self._source_seq = 0  # Nothing shown yet
+        self._every_frame = every_frame
+        if every_frame:
+            source.set_update_callback(self._collect)
+
+    def _collect(self, pixels):
+        """Collect a frame on the mode's thread (see set_source)"""
+        if not self.paused:
+            self.set_pixels(pixels)
+
+    def set_pixels(self, pixels):
+        """Collect a frame"""
+        if len(pixels) != self.led_count:
+            return
+        now = time.monotonic()
+        pixels = tuple(pixels)
+        self.frames.append((now, pixels))
+        self.frame_count += 1
+        if self.sink:
+            self.sink(now, pixels)
+
+    def pull(self):
+        """Take the latest frame from the source, if it showed a new one"""
+        if self.source is None or self.paused or self._every_frame:
+            return
+        update = self.source.get_frame(self._source_seq)
+        if update is not None:
+            self._source_seq, pixels = update
+            self.set_pixels(pixels)
+
+    @property
+    def latest(self):
+        """The most recent frame, or None"""
+        return self.frames[-1][1] if self.frames else None
+
+    def run(self, duration=None, until=None):
+        """
+        Collect frames (blocking)
+
+        Args:
+            duration: Optional seconds to run for
+            until: Optional callable; stop as soon as it returns True
+        """
+        deadline = time.monotonic() + duration if duration is not None else None
+        period = 1.0 / self.fps if self.fps else 0.0
+        while self.running:
+            self.pull()
+            if until is not None and until():
+                self.pull()  # The last frame before it stopped
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(period)
+        self.running = False
+
+    def update(self):
+        """Single update cycle (for non-blocking usage)"""
+        if not self.running:
+            return False
+        self.pull()
+        return True
+
+    def close(self):
+        """Stop collecting"""
+        self.running = False
@@ -2,8 +2,35 @@
 """
 Mock hardware modules for LED matrix visualization.
 This allows running the original LED scripts without actual hardware.
+
+show() only marks a new frame (a sequence number); the visualizer pulls the
+latest frame with get_frame() at its own refresh rate, so a mode that shows
+after every pixel (auto_write=True) costs no more to display than one that
+shows once per frame.
+
+Optionally (MockNeoPixel.wire_timing = True) show() takes as long as it
+would on a real WS2812 chain: 24 bits of 1.25 us per LED, plus the reset
+latch. That shows whether a mode can keep its frame rate on a longer chain.
 """
 
+import threading
+import time
+
+# WS2812 wire timing
+WS2812_BIT_TIME = 1.25e-6  # Seconds per bit (800 kHz)
+WS2812_BITS_PER_LED = 24
+WS2812_RESET_TIME = 280e-6  # Low time that latches the frame (WS2812B)
+
+
+def wire_time(led_count):
+    """Seconds it takes to send one frame to a chain of WS2812 LEDs"""
+    return led_count * WS2812_BITS_PER_LED * WS2812_BIT_TIME + WS2812_RESET_TIME
+
+
+def max_fps(led_count):
+    """Highest frame rate a chain of WS2812 LEDs can show"""
+    return 1.0 / wire_time(led_count)
+
 class MockBoard:
     """Mock board module"""
     pass
@@ -15,6 +42,7 @@ class MockNeoPixel:
     """Mock NeoPixel class that stores LED states for visualization"""
 
     _instances = []  # Track all instances for visualization access
+    wire_timing = False  # Make show() take as long as on real LEDs
 
     def __init__(self, pin, n, brightness=1.0, auto_write=True, pixel_order=None):
         self.pin = pin
@@ -23,7 +51,15 @@ class MockNeoPixel:
         self.auto_write = auto_write
         self.pixel_order = pixel_order
         self._pixels = [(0, 0, 0)] * n
+        self._seq = 0  # Bumped on every show()
+        # (seq, pixels) as of the last show(), so a reader never sees a
+        # frame the mode is still drawing
+        self._frame = (0, tuple(self._pixels))
+        self._lock = threading.Lock()
+        self.wire_time = wire_time(n)
+        self.wire_total = 0.0  # Seconds spent sending frames, with wire_timing
         self._callback = None
+        self._recorder = None
         MockNeoPixel._instances.append(self)
 
     def __len__(self):
@@ -33,9 +69,14 @@ class MockNeoPixel:
         """Set a pixel color"""
         if isinstance(index, slice):
             # Handle slice assignment
-            start, stop, step = index.indices(self.n)
-            for i in range(start, stop, step):
-                self._pixels[i] = self._ensure_tuple(val)
+            indices = range(*index.indices(self.n))
+            if isinstance(val, (list, tuple)) and val and isinstance(val[0], (list, tuple)):
+                # One color per pixel, like the real NeoPixel
+                for i, color in zip(indices, val):
+                    self._pixels[i] = self._ensure_tuple(color)
+            else:
+                for i in indices:
+                    self._pixels[i] = self._ensure_tuple(val)
         else:
             if 0 <= index < self.n:
                 self._pixels[index] = self._ensure_tuple(val)
@@ -66,9 +107,21 @@ class MockNeoPixel:
             self.show()
 
     def show(self):
-        """Update the display (triggers visualization callback)"""
+        """Update the display (marks a new frame for get_frame())"""
+        if self.wire_timing:
+            # Looked up on every call, so on a virtual clock this is virtual
+            # time, also from a render thread the mode started (see
+            # virtual_clock); from any other thread it is real time
+            time.sleep(self.wire_time)
+            self.wire_total += self.wire_time
+        pixels = tuple(self._pixels)
+        with self._lock:
+            self._seq += 1
+            self._frame = (self._seq, pixels)
         if self._callback:
-            self._callback(self._pixels.copy())
+            self._callback(pixels)
+        if self._recorder:
+            self._recorder.write(bytes(c for pixel in pixels for c in pixel))
 
     @property
     def brightness(self):
@@ -79,13 +132,37 @@ class MockNeoPixel:
         self._brightness = max(0.0, min(1.0, float(val)))
 
     def set_update_callback(self, callback):
-        """Set a callback function to be called when pixels are updated"""
+        """
+        Set a callback function to be called with the shown pixels (a
+        tuple) on every show(); prefer polling get_frame() for display
+        """
         self._callback = callback
 
+    def set_recorder(self, recorder):
+        """Record every shown frame (a core.recorder.Recorder, or None to stop)"""
+        self._recorder = recorder
+
     def get_pixels(self):
         """Get current pixel state"""
         return self._pixels.copy()
 
+    def get_frame(self, since=None):
+        """
+        Get the last shown frame, if there is a newer one
+
+        Args:
+            since: Sequence number of the frame the caller already has
+
+        Returns:
+            (sequence number, pixels as a tuple), as they were when that
+            frame was shown, or None if no frame was shown since `since`
+        """
+        with self._lock:
+            frame = self._frame
+        if frame[0] == since:
+            return None
+        return frame
+
     @classmethod
     def get_latest_instance(cls):
         """Get the most recently created NeoPixel instance"""
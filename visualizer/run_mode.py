@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 """
 LED Matrix Mode Runner with Visualization
-Runs LED matrix modes with a virtual display instead of real hardware
+Runs LED matrix modes with a virtual display instead of real hardware,
+or without any display (--headless)
 """
 
 import sys
 import os
+import json
 import importlib.util
 import threading
 import time
@@ -21,6 +23,12 @@ MODE_REDIRECTS = {
     "quadrant-clock-with-pomodoro-timer": "clock",
 }
 
+# Real seconds a headless run on a virtual clock may take beyond its
+# duration at the chosen speed (real time at 'max') before it is stopped.
+# Virtual time only advances when the mode sleeps, so a mode that hardly
+# sleeps (pixels-fighting) could otherwise take much longer than in real time.
+TIMEOUT_MARGIN = 10
+
 # Import mock hardware BEFORE any mode scripts can import real hardware
 import mock_hardware
 
@@ -28,17 +36,38 @@ import mock_hardware
 sys.modules['board'] = mock_hardware
 sys.modules['neopixel'] = mock_hardware
 
-# Now import the GUI
-from gui import ThreadedVisualizer
+# The GUI (and PyGame) is only imported when a window is opened
+from core.geometry import Geometry
+from core.recorder import Recorder
+
+
+def load_geometry(config_path):
+    """Matrix geometry from config.json, or the default 8x8 without one"""
+    if not config_path or not os.path.exists(config_path):
+        return Geometry()
+    with open(config_path) as f:
+        return Geometry.from_config(json.load(f))
 
 
-def run_mode(mode_path, config_path=None):
+def run_mode(mode_path, config_path=None, record_path=None, headless=False, duration=None,
+             speed=1.0, wire_timing=False, profile=None, timeout=None):
     """
     Run a LED mode script with visualization
 
     Args:
         mode_path: Path to the mode's main.py file
         config_path: Optional path to config.json
+        record_path: Optional file to record the shown frames to
+        headless: Collect the frames without opening a window
+        duration: Optional seconds to run for (headless only); virtual
+            seconds when running on a virtual clock
+        speed: How many times faster than real time to run the mode on a
+            virtual clock (1.0 for real time, None for as fast as possible)
+        wire_timing: Make show() take as long as on real WS2812 LEDs
+        profile: Optional seconds to profile the mode for (see core.profiling)
+        timeout: Optional real seconds after which a headless run on a
+            virtual clock is stopped, whatever its virtual time (defaults
+            to the duration at the given speed, plus TIMEOUT_MARGIN)
     """
 
     if not os.path.exists(mode_path):
@@ -56,19 +85,30 @@ def run_mode(mode_path, config_path=None):
     # Create visualizer (but don't start it yet)
     mode_name = os.path.basename(os.path.dirname(mode_path))
 
-    print(f"Starting visualizer for mode: {mode_name}")
-    print("Controls:")
-    print("  Q - Quit")
-    print("  SPACE - Pause/Resume")
-    print("  +/- - Adjust brightness")
+    print(f"Starting {'headless ' if headless else ''}visualizer for mode: {mode_name}")
+    if not headless:
+        print("Controls:")
+        print("  Q - Quit")
+        print("  SPACE - Pause/Resume")
+        print("  +/- - Adjust brightness")
     print()
 
     # Clear any existing mock instances
     mock_hardware.MockNeoPixel.clear_instances()
+    mock_hardware.MockNeoPixel.wire_timing = wire_timing
+
+    # Simulated time for the mode's thread, held until the visualizer is connected
+    clock = None
+    if speed != 1.0:
+        from virtual_clock import VirtualClock
+        clock = VirtualClock(speed, limit=duration if headless else None, paused=True)
+        clock.install()
+        print(f"Running on a virtual clock ({f'{speed:g}x' if speed else 'unbounded'})")
 
     # Load and run the mode script in a separate thread
     script_thread = None
     neopixel_instance_ref = [None]  # Use list to allow modification in closure
+    profiler_ref = [None]
 
     def run_script():
         try:
@@ -78,6 +118,12 @@ def run_mode(mode_path, config_path=None):
 
             # Give visualizer a moment to initialize
             time.sleep(0.2)
+            if clock:
+                clock.attach()
+            if profile:
+                from core.profiling import ModeProfiler
+                profiler_ref[0] = ModeProfiler(mode_name, profile, os.path.join(BASE_DIR, "profiles"))
+                profiler_ref[0].start()
 
             # Execute the module (this runs the mode's main code)
             spec.loader.exec_module(module)
@@ -97,42 +143,107 @@ def run_mode(mode_path, config_path=None):
 
     # Wait a moment for the script to create its NeoPixel instance
     time.sleep(0.3)
+    deadline = time.monotonic() + 5.0  # Slow imports, e.g. numpy on a cold start
+    while (not mock_hardware.MockNeoPixel.get_latest_instance() and script_thread.is_alive()
+           and time.monotonic() < deadline):
+        time.sleep(0.05)
 
     # Get the NeoPixel instance
     neopixel_instance = mock_hardware.MockNeoPixel.get_latest_instance()
 
     if neopixel_instance:
         print(f"Connected to NeoPixel instance ({neopixel_instance.n} LEDs)")
+        if wire_timing:
+            print(f"WS2812 timing: {neopixel_instance.wire_time * 1000:.2f} ms per show(), "
+                  f"at most {mock_hardware.max_fps(neopixel_instance.n):.0f} FPS")
     else:
         print("Warning: No NeoPixel instance found")
 
-    # Now create visualizer on main thread
-    from gui import LEDMatrixVisualizer
-    viz = LEDMatrixVisualizer(
-        width=8,
-        height=8,
-        led_size=60,
-        spacing=5,
-        title=f"LED Matrix: {mode_name}"
-    )
-
-    # Set up callback to update visualizer when pixels change
+    recorder = None
+    if record_path and neopixel_instance:
+        recorder = Recorder(
+            record_path, neopixel_instance.n, start=clock.monotonic_start if clock else None
+        )
+        neopixel_instance.set_recorder(recorder)
+        if clock:
+            # The mode is held, so this is the frame it showed at virtual time 0
+            pixels = neopixel_instance.get_frame()[1]
+            recorder.write(bytes(c for pixel in pixels for c in pixel), clock.monotonic_start)
+        print(f"Recording to {record_path}")
+
+    # Now create visualizer on main thread, sized for the configured matrix
+    geometry = load_geometry(os.environ.get("LEDMATRIX_CONFIG"))
+    if headless:
+        from headless import HeadlessVisualizer
+        viz = HeadlessVisualizer(width=geometry.width, height=geometry.height)
+    else:
+        from gui import LEDMatrixVisualizer
+        led_size = max(8, min(60, 520 // max(geometry.width, geometry.height)))
+        viz = LEDMatrixVisualizer(
+            width=geometry.width,
+            height=geometry.height,
+            led_size=led_size,
+            spacing=max(1, led_size // 12),
+            title=f"LED Matrix: {mode_name}"
+        )
+
+    # The visualizer pulls the latest frame at its own refresh rate, however
+    # often the mode calls show()
     if neopixel_instance:
-        def update_viz(pixels):
-            if viz.running and not viz.paused:
-                viz.set_pixels(pixels)
-
-        neopixel_instance.set_update_callback(update_viz)
-
-        # Set initial state
-        viz.set_pixels(neopixel_instance.get_pixels())
+        # On a virtual clock frames come faster than they can be pulled
+        every_frame = bool(clock and headless)
+        viz.set_source(neopixel_instance, every_frame=every_frame)
+        shown = neopixel_instance.get_frame(0)
+        if every_frame and shown:
+            viz.set_pixels(shown[1])  # Shown before the callback was set
 
     # Run visualizer on main thread (blocking until closed)
+    started = time.monotonic()
+    if clock:
+        clock.resume()
     try:
-        viz.run()
+        if headless and clock:
+            if timeout is None and duration is not None:
+                timeout = duration / min(speed or 1, 1) + TIMEOUT_MARGIN
+
+            def exhausted():
+                return clock.finished.is_set() or (duration is not None and clock.elapsed >= duration)
+
+            viz.run(timeout, until=lambda: exhausted() or not script_thread.is_alive())
+            if not exhausted() and script_thread.is_alive():
+                clock.pause()  # Hold the mode at its next sleep
+                print(f"Timed out after {time.monotonic() - started:.1f}s real time; "
+                      "the mode hardly sleeps, so its virtual time barely advanced")
+        elif headless:
+            viz.run(duration, until=lambda: not script_thread.is_alive())
+        else:
+            viz.run()
     except KeyboardInterrupt:
         print("\nShutting down...")
 
+    if headless:
+        elapsed = time.monotonic() - started
+        shown = neopixel_instance._seq if neopixel_instance else 0
+        print(f"Collected {viz.frame_count} frames ({shown} shown by the mode) in {elapsed:.1f}s")
+        if clock:
+            print(f"Simulated {clock.elapsed:.1f}s")
+
+    if wire_timing and neopixel_instance:
+        # Time on the wire, in the mode's own (possibly virtual) time
+        mode_time = clock.elapsed if clock else time.monotonic() - started
+        if mode_time > 0:
+            print(f"{neopixel_instance._seq / mode_time:.1f} show() calls per second, "
+                  f"{neopixel_instance.wire_total / mode_time:.0%} of the time on the wire")
+
+    if profiler_ref[0]:
+        profiler_ref[0].finish()  # Closed before the profile time was up
+
+    if recorder:
+        neopixel_instance.set_recorder(None)
+        # The last frame was shown until now, in the mode's own time
+        recorder.close(clock.monotonic_start + clock.elapsed if clock else None)
+        print(f"Recorded {recorder.frames} frames to {record_path}")
+
     print("Visualizer closed")
 
 
@@ -163,6 +274,24 @@ def main():
     parser.add_argument("mode", nargs="?", help="Mode name or path to main.py")
     parser.add_argument("--list", action="store_true", help="List available modes")
     parser.add_argument("--config", help="Path to config.json")
+    parser.add_argument("--record", metavar="PATH", help="Record the shown frames to a file")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run without a window (no PyGame needed)")
+    parser.add_argument("--duration", type=float, metavar="SECONDS",
+                        help="Stop after this many seconds (headless only)")
+    parser.add_argument("--wire-timing", action="store_true",
+                        help="Make show() take as long as on real WS2812 LEDs and "
+                             "report the highest possible frame rate")
+    parser.add_argument("--profile", type=float, metavar="SECONDS",
+                        help="Profile the mode for its first SECONDS (real time) and write the collapsed stacks "
+                             "to the profiles directory")
+    parser.add_argument("--speed", default="1", metavar="FACTOR",
+                        help="Run the mode on a virtual clock this many times faster than "
+                             "real time, or 'max' for as fast as possible")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS",
+                        help="Stop a headless run on a virtual clock after this many real "
+                             "seconds (default: the duration in real time, plus "
+                             f"{TIMEOUT_MARGIN}s)")
 
     args = parser.parse_args()
 
@@ -208,7 +337,11 @@ def main():
         mode_path = os.path.join(BASE_DIR, "modes", mode, "main.py")
 
     # Run the mode
-    run_mode(mode_path, args.config)
+    speed = None if args.speed == "max" else float(args.speed)
+    run_mode(
+        mode_path, args.config, args.record, args.headless, args.duration, speed, args.wire_timing,
+        args.profile, args.timeout
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Virtual clock for simulating modes faster than real time.
+
+Modes are paced by time.sleep() and read the time with time.time(),
+time.monotonic() and datetime.now(). VirtualClock replaces those for the
+mode's thread only: a sleep advances the virtual time by exactly the
+requested amount and waits only that long divided by the speed (or not at
+all), and the clock functions return the virtual time. Other threads (the
+GUI, the headless collector) keep the real time.
+
+Computing a frame takes no virtual time, so a mode shows the same frames
+at the same virtual timestamps however fast the simulation runs.
+
+    clock = VirtualClock(speed=100)
+    clock.install()
+    # ... in the mode's thread:
+    clock.attach()
+
+With a limit, the mode is held at the sleep that reaches it, so a run of,
+for example, one virtual hour ends at exactly that frame.
+
+Threads the mode starts itself (such as core.render_thread's RenderThread)
+run on the same clock as followers. Their sleeps don't advance the virtual
+time; they wait until the mode's sleeps have brought it to their wake-up
+time. A render thread therefore takes as long to write a frame, in virtual
+time, as it would on the real LEDs, in parallel with the mode.
+"""
+
+import datetime
+import threading
+import time
+
+_real_sleep = time.sleep
+_real_time = time.time
+_real_monotonic = time.monotonic
+_real_datetime = datetime.datetime
+_real_thread_start = threading.Thread.start
+
+FOLLOWER_TIMEOUT = 0.1  # Real seconds the mode waits for a follower to wake up
+
+_active = None  # The installed VirtualClock
+
+
+class _VirtualDatetime(_real_datetime):
+    """datetime that reads the virtual clock in a mode's thread"""
+
+    @classmethod
+    def now(cls, tz=None):
+        clock = _active
+        if clock is None or not clock.attached:
+            return _real_datetime.now(tz)
+        return cls.fromtimestamp(clock.time(), tz)
+
+    @classmethod
+    def today(cls):
+        return cls.now()
+
+    @classmethod
+    def utcnow(cls):
+        clock = _active
+        if clock is None or not clock.attached:
+            return _real_datetime.utcnow()
+        return cls.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _thread_start(thread):
+    """threading.Thread.start that puts threads started by a mode on its clock"""
+    clock = _active
+    if clock is not None and clock.attached:
+        run = thread.run
+
+        def follow():
+            clock.attach(follow=True)
+            run()
+
+        thread.run = follow
+    _real_thread_start(thread)
+
+
+class VirtualClock:
+    """Time that only advances when a mode sleeps"""
+
+    def __init__(self, speed=None, start=None, limit=None, paused=False):
+        """
+        Initialize the clock
+
+        Args:
+            speed: How many times faster than real time to run, or None to
+                not wait at all
+            start: Optional Unix time the virtual clock starts at (defaults
+                to now)
+            limit: Optional virtual seconds after which sleeps never return
+            paused: Hold sleeping modes until resume() is called
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("Speed must be positive")
+        self.speed = speed
+        self.limit = limit
+        self.elapsed = 0.0  # Virtual seconds since the start
+        self.wall_start = _real_time() if start is None else start
+        self.monotonic_start = _real_monotonic()
+        self.finished = threading.Event()  # Set once the limit is reached
+        self._resumed = threading.Event()
+        if not paused:
+            self._resumed.set()
+        self._local = threading.local()
+        self._advanced = threading.Condition()  # Notified when the virtual time moves
+        self._waking = []  # Virtual wake-up times of sleeping followers
+
+    @property
+    def attached(self):
+        """True in a thread that runs on this clock"""
+        return getattr(self._local, "attached", False)
+
+    def attach(self, follow=False):
+        """
+        Run the calling thread on the virtual clock
+
+        Args:
+            follow: Wait for the virtual time in sleeps instead of advancing it
+        """
+        self._local.attached = True
+        self._local.follow = follow
+
+    def detach(self):
+        self._local.attached = False
+
+    def pause(self):
+        """Hold the modes at their next sleep"""
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def install(self):
+        """Patch time and datetime; do this before the mode imports datetime"""
+        global _active
+        _active = self
+        time.sleep = self.sleep
+        time.time = self.time
+        time.monotonic = self.monotonic
+        datetime.datetime = _VirtualDatetime
+        threading.Thread.start = _thread_start
+
+    def uninstall(self):
+        global _active
+        _active = None
+        time.sleep = _real_sleep
+        time.time = _real_time
+        time.monotonic = _real_monotonic
+        datetime.datetime = _real_datetime
+        threading.Thread.start = _real_thread_start
+
+    def sleep(self, seconds):
+        if not self.attached:
+            _real_sleep(seconds)
+            return
+        if seconds < 0:
+            raise ValueError("sleep length must be non-negative")
+        self._resumed.wait()
+        if getattr(self._local, "follow", False):
+            self._follow(seconds)
+            return
+        if self.limit is not None and self.elapsed + seconds >= self.limit:
+            with self._advanced:
+                self.elapsed = self.limit
+                self.finished.set()
+                self._advanced.notify_all()
+            threading.Event().wait()  # Held for good
+        with self._advanced:
+            self.elapsed += seconds
+            self._advanced.notify_all()
+            # Let the followers that are due catch up before the mode goes on
+            self._advanced.wait_for(
+                lambda: not any(wake <= self.elapsed for wake in self._waking), FOLLOWER_TIMEOUT
+            )
+        # Even when not waiting, let the other threads run
+        _real_sleep(seconds / self.speed if self.speed else 0)
+
+    def _follow(self, seconds):
+        """Sleep of a follower: wait until the mode's sleeps reach the wake-up time"""
+        with self._advanced:
+            wake = self.elapsed + seconds
+            self._waking.append(wake)
+            self._advanced.wait_for(lambda: self.elapsed >= wake)
+            self._waking.remove(wake)
+            self._advanced.notify_all()
+
+    def time(self):
+        if not self.attached:
+            return _real_time()
+        return self.wall_start + self.elapsed
+
+    def monotonic(self):
+        if not self.attached:
+            return _real_monotonic()
+        return self.monotonic_start + self.elapsed